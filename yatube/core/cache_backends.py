@@ -0,0 +1,54 @@
+"""Файловый кэш с атомарными incr и add.
+
+В FileBasedCache из Django incr - это чтение и запись отдельными
+шагами, и два процесса, увеличивающие счетчик одновременно, получают
+одно и то же значение: CacheHub теряет события живой ленты, а журнал
+автодополнения перезаписывает изменения. Здесь incr и add выполняются
+под блокировкой файла в каталоге кэша, общей для потоков и процессов.
+Обычные set атомарны и без нее: файл записывается во временный
+и переименовывается.
+
+Перед каждым set Django перечисляет все файлы каталога, чтобы решить,
+не пора ли удалить часть записей, и при десятках тысяч записей это
+дороже самой записи. Здесь каталог перечисляется лишь при каждой
+CULL_CHECK_INTERVAL-й записи процесса, поэтому кэш может превысить
+MAX_ENTRIES на столько записей, сколько процессы успеют сделать между
+проверками."""
+import itertools
+import os
+from contextlib import contextmanager
+
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.files import locks
+
+LOCK_NAME = 'incr.lock'
+CULL_CHECK_INTERVAL = 100
+
+_sets = itertools.count(1)
+
+
+class FileBasedCache(filebased.FileBasedCache):
+
+    @contextmanager
+    def _lock(self):
+        self._createdir()
+        with open(os.path.join(self._dir, LOCK_NAME), 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock)
+
+    def _cull(self):
+        if next(_sets) % CULL_CHECK_INTERVAL:
+            return
+        super()._cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._lock():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._lock():
+            return super().incr(key, delta, version)
@@ -0,0 +1,242 @@
+import json
+import platform
+import statistics
+import time
+from contextlib import ExitStack
+from importlib import import_module
+
+import django
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, F
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.sharding import for_author, sharded
+
+BENCHMARK_URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+CLIENTS = ('anonymous', 'user')
+# Адрес не входит в INTERNAL_IPS, чтобы debug toolbar не искажал замеры.
+CLIENT_ADDRESS = '192.0.2.1'
+THRESHOLD = 20
+# Страницы, которые меняют данные уже на GET: замеры не должны
+# подписывать пользователя на автора или разлогинивать его.
+MUTATING_URL_NAMES = (
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'users:logout',
+)
+
+
+def get_url_names():
+    """Имена URL приложений из BENCHMARK_URLCONFS с аргументами,
+    кроме страниц из MUTATING_URL_NAMES."""
+    for urlconf in BENCHMARK_URLCONFS:
+        module = import_module(urlconf)
+        for pattern in module.urlpatterns:
+            name = f'{module.app_name}:{pattern.name}'
+            if name not in MUTATING_URL_NAMES:
+                yield name, list(pattern.pattern.converters)
+
+
+def get_samples():
+    """Аргументы URL из самых нагруженных данных: популярный автор,
+    его последняя запись и самое большое сообщество. Запросы шлет
+    пользователь с наибольшим числом подписок."""
+    author = User.objects.annotate(
+        followers=Count('following')
+    ).order_by('-followers', 'pk').first()
+    if author is None:
+        raise CommandError('БД пуста, заполните ее командой seed_data.')
+    user = User.objects.exclude(pk=author.pk).annotate(
+        follows=Count('follower')
+    ).order_by('-follows', 'pk').first() or author
+    post = for_author(
+        Post.objects.filter(author=author), author.pk
+    ).order_by('-pub_date').first()
+    group = Group.objects.order_by(
+        F('post_counter__posts_count').desc(nulls_last=True), 'pk'
+    ).first()
+    if post is None or group is None:
+        raise CommandError(
+            'В БД нет записей или сообществ, заполните ее командой seed_data.'
+        )
+    return user, {
+        'username': author.username,
+        'post_id': post.pk,
+        'slug': group.slug,
+        'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+    }
+
+
+def get_percentile(values, percentile):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100)[percentile - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержки и число запросов к БД для всех страниц '
+        'приложений posts, users и about и сохраняет результаты в JSON. '
+        'С --compare сравнивает их с прошлым запуском и завершается '
+        'ошибкой при регрессии. Страницы, меняющие данные на GET, '
+        'пропускаются; кэш не очищается, его заполняют --warmup запросов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', help='Файл для результатов.')
+        parser.add_argument('--label', help='Метка запуска, например коммит.')
+        parser.add_argument('--compare', help='Результаты прошлого запуска.')
+        parser.add_argument(
+            '--threshold', type=float, default=THRESHOLD,
+            help='Допустимый рост p95 в процентах.'
+        )
+
+    def handle(self, *args, **options):
+        user, samples = get_samples()
+        clients = {
+            name: Client(REMOTE_ADDR=CLIENT_ADDRESS) for name in CLIENTS
+        }
+        clients['user'].force_login(user)
+        # Токен сброса пароля зависит от времени входа пользователя.
+        samples['token'] = default_token_generator.make_token(user)
+        results = []
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            for name, arguments in get_url_names():
+                url = reverse(name, kwargs={
+                    argument: samples[argument] for argument in arguments
+                })
+                for client_name, client in clients.items():
+                    results.append(self.measure(
+                        name, url, client_name, client, options
+                    ))
+        report = {
+            'label': options['label'],
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'debug': settings.DEBUG,
+            'iterations': options['iterations'],
+            'data': self.get_data_volume(),
+            'results': results,
+        }
+        for result in results:
+            self.stdout.write(self.format_result(result))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+        self.check_statuses(results)
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def check_statuses(self, results):
+        """Замер без ошибок: у страницы один и тот же статус на всех
+        итерациях, успешный или перенаправление. Перенаправляют, например,
+        страницы только для авторизованных при запросе анонима."""
+        failed = [
+            f'{result["name"]} ({result["client"]}): {result["status"]}'
+            for result in results
+            if result['status'] is None or result['status'] >= 400
+        ]
+        if failed:
+            raise CommandError(
+                'Страницы с ошибкой или разным статусом ответа:\n'
+                + '\n'.join(failed)
+            )
+
+    def get_data_volume(self):
+        return {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'follows': Follow.objects.count(),
+            'posts': sharded(Post.objects.all()).count(),
+            'comments': sharded(Comment.objects.all()).count(),
+        }
+
+    def request(self, url, client):
+        """Выполняет запрос и возвращает ответ, время в секундах и число
+        запросов ко всем БД. У потоковых ответов измеряется время до
+        начала потока."""
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        response.close()
+        return response, elapsed, sum(len(context) for context in contexts)
+
+    def measure(self, name, url, client_name, client, options):
+        latencies, queries, statuses = [], [], set()
+        for number in range(options['warmup'] + options['iterations']):
+            response, elapsed, count = self.request(url, client)
+            statuses.add(response.status_code)
+            if number >= options['warmup']:
+                latencies.append(elapsed * 1000)
+                queries.append(count)
+        return {
+            'name': name,
+            'client': client_name,
+            'url': url,
+            'status': statuses.pop() if len(statuses) == 1 else None,
+            'p50_ms': round(get_percentile(latencies, 50), 3),
+            'p95_ms': round(get_percentile(latencies, 95), 3),
+            'p99_ms': round(get_percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries': max(queries),
+        }
+
+    def format_result(self, result):
+        return (
+            f'{result["name"]:<30} {result["client"]:<9} '
+            f'{result["status"]} p50 {result["p50_ms"]:.2f} мс, '
+            f'p95 {result["p95_ms"]:.2f} мс, '
+            f'запросов {result["queries"]}'
+        )
+
+    def compare(self, results, path, threshold):
+        """Сравнивает с прошлым запуском: регрессией считается рост p95
+        больше threshold процентов, рост числа запросов или другой
+        статус ответа."""
+        with open(path, encoding='utf-8') as stream:
+            baseline = {
+                (result['name'], result['client']): result
+                for result in json.load(stream)['results']
+            }
+        regressions = []
+        for result in results:
+            previous = baseline.get((result['name'], result['client']))
+            if previous is None:
+                continue
+            limit = previous['p95_ms'] * (1 + threshold / 100)
+            if (
+                result['p95_ms'] > limit
+                or result['queries'] > previous['queries']
+                or result['status'] != previous['status']
+            ):
+                regressions.append(
+                    f'{result["name"]} ({result["client"]}): '
+                    f'p95 {previous["p95_ms"]:.2f} -> '
+                    f'{result["p95_ms"]:.2f} мс, запросов '
+                    f'{previous["queries"]} -> {result["queries"]}, '
+                    f'статус {previous["status"]} -> {result["status"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,263 @@
+import itertools
+import json
+import os
+import secrets
+import shlex
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .benchmark import get_samples
+
+PROFILES = ('development', 'production')
+SERVER = (
+    'gunicorn yatube.wsgi --workers 4 --threads 8 --bind 127.0.0.1:{port}'
+)
+PORT = 8765
+STARTUP_TIMEOUT = 30
+REQUEST_TIMEOUT = 10
+WARMUP_DURATION = 0.5
+PAGES = (
+    ('posts:posts_list', ()),
+    ('posts:group_list', ('slug',)),
+    ('posts:profile', ('username',)),
+    ('posts:post_detail', ('post_id',)),
+)
+# anonymous - анонимные запросы, которые после первого отдаются из кэша
+# страниц; uncached - анонимные запросы с уникальным параметром, кэш
+# страниц не срабатывает; user - запросы авторизованного пользователя.
+CLIENTS = ('anonymous', 'uncached', 'user')
+
+
+def get_paths(samples):
+    return [
+        reverse(name, kwargs={
+            argument: samples[argument] for argument in arguments
+        })
+        for name, arguments in PAGES
+    ]
+
+
+@contextmanager
+def user_session(user, secret_key):
+    """Возвращает cookie сессии пользователя для серверов с ключом
+    secret_key. Сессия хранится в общей БД, поэтому ее видят все
+    процессы; после замеров она удаляется."""
+    client = Client()
+    with override_settings(SECRET_KEY=secret_key):
+        client.force_login(user)
+    cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+    try:
+        yield f'{cookie.key}={cookie.value}'
+    finally:
+        with override_settings(SECRET_KEY=secret_key):
+            client.logout()
+
+
+def wait_for_server(process, port):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(
+                f'Сервер завершился с кодом {process.returncode}.'
+            )
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Сервер не запустился за {STARTUP_TIMEOUT} с.')
+
+
+@contextmanager
+def serve(profile, server, port, secret_key):
+    """Запускает сервер с профилем profile и возвращает его адрес."""
+    environ = {
+        **os.environ,
+        'YATUBE_PROFILE': profile,
+        'DJANGO_DB_NAME': str(settings.DATABASES['default']['NAME']),
+        'DJANGO_SECRET_KEY': secret_key,
+    }
+    environ.pop('DJANGO_DEBUG', None)
+    command = shlex.split(server.format(port=port))
+    try:
+        process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=environ,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    except OSError as error:
+        raise CommandError(
+            f'Не удалось запустить сервер {command[0]}: {error}. '
+            'Установите зависимости из requirements.txt '
+            'или укажите команду в --server.'
+        )
+    try:
+        wait_for_server(process, port)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        try:
+            process.wait(STARTUP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_worker(url, deadline, results, headers, numbers):
+    latencies = []
+    errors = 0
+    while time.monotonic() < deadline:
+        request = Request(
+            url if numbers is None else f'{url}?nocache={next(numbers)}',
+            headers=headers
+        )
+        started = time.perf_counter()
+        try:
+            with urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                response.read()
+        except OSError:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+    results.append((latencies, errors))
+
+
+def run_load(url, concurrency, duration, headers=None, unique=False):
+    """Запрашивает url из concurrency потоков в течение duration секунд
+    и возвращает задержки успешных ответов и число ошибок. С unique
+    каждый запрос получает свой параметр и мимо кэша страниц."""
+    deadline = time.monotonic() + duration
+    results = []
+    numbers = itertools.count() if unique else None
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            args=(url, deadline, results, headers or {}, numbers)
+        )
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (
+        [latency for latencies, _ in results for latency in latencies],
+        sum(errors for _, errors in results),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает WSGI-сервер по очереди с профилями development '
+        'и production и сравнивает число обработанных запросов в секунду '
+        'на главных страницах для анонима из кэша страниц, анонима мимо '
+        'кэша страниц и авторизованного пользователя. Ответы не 2xx '
+        'считаются ошибками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', default=SERVER,
+            help='Команда запуска сервера, {port} заменяется портом.'
+        )
+        parser.add_argument('--port', type=int, default=PORT)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--output', help='Файл для результатов.')
+
+    def handle(self, *args, **options):
+        user, samples = get_samples()
+        paths = get_paths(samples)
+        secret_key = os.environ.get(
+            'DJANGO_SECRET_KEY', secrets.token_urlsafe(50)
+        )
+        report = {
+            'server': options['server'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'results': [],
+        }
+        with user_session(user, secret_key) as cookie:
+            headers = {
+                'anonymous': {},
+                'uncached': {},
+                'user': {'Cookie': cookie},
+            }
+            for profile in PROFILES:
+                self.stdout.write(profile)
+                with serve(
+                    profile, options['server'], options['port'], secret_key
+                ) as base_url:
+                    for client, path in itertools.product(CLIENTS, paths):
+                        # Первый запрос заполняет кэши процесса.
+                        run_load(
+                            base_url + path, 1, WARMUP_DURATION,
+                            headers[client]
+                        )
+                        result = self.measure(
+                            profile, client, base_url, path,
+                            headers[client], options
+                        )
+                        report['results'].append(result)
+                        self.stdout.write(self.format_result(result))
+        self.stdout.write(self.format_comparison(report['results']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+        errors = sum(result['errors'] for result in report['results'])
+        if errors:
+            raise CommandError(f'Ответов с ошибкой: {errors}.')
+
+    def measure(self, profile, client, base_url, path, headers, options):
+        latencies, errors = run_load(
+            base_url + path, options['concurrency'], options['duration'],
+            headers, unique=client == 'uncached'
+        )
+        percentiles = (
+            statistics.quantiles(latencies, n=100)
+            if len(latencies) > 1 else [0] * 99
+        )
+        return {
+            'profile': profile,
+            'client': client,
+            'path': path,
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / options['duration'], 1),
+            'p50_ms': round(percentiles[49] * 1000, 3),
+            'p95_ms': round(percentiles[94] * 1000, 3),
+        }
+
+    def format_result(self, result):
+        return (
+            f'  {result["client"]:<9} {result["path"]:<40} '
+            f'{result["rps"]:>8.1f} з/с, '
+            f'p50 {result["p50_ms"]:.2f} мс, p95 {result["p95_ms"]:.2f} мс, '
+            f'ошибок {result["errors"]}'
+        )
+
+    def format_comparison(self, results):
+        rps = {
+            (result['profile'], result['client'], result['path']):
+                result['rps']
+            for result in results
+        }
+        lines = ['production / development:']
+        for client, path in dict.fromkeys(
+            (result['client'], result['path']) for result in results
+        ):
+            development = rps[('development', client, path)]
+            ratio = (
+                rps[('production', client, path)] / development
+                if development else 0
+            )
+            lines.append(f'  {client:<9} {path:<40} x{ratio:.2f}')
+        return '\n'.join(lines)
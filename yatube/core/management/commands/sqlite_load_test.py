@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.signals import apply_pragmas
+
+# Ожидание блокировки задается только PRAGMA busy_timeout: без настроек
+# занятая БД сразу дает ошибку, как у SQLite по умолчанию.
+SQLITE_TIMEOUT = 0
+NUMBER_AUTHORS = 10
+NUMBER_SEED_POSTS = 1000
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT, created REAL)',
+    'CREATE TABLE counter (author_id INTEGER PRIMARY KEY, posts INTEGER)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE INDEX comment_post ON comment (post_id, created)',
+)
+FEED_QUERY = (
+    'SELECT post.id, post.text, (SELECT COUNT(*) FROM comment '
+    'WHERE comment.post_id = post.id) FROM post '
+    'ORDER BY pub_date DESC LIMIT 10'
+)
+
+
+def connect(path, pragmas):
+    # Как и Django, работаем в режиме автокоммита.
+    db = sqlite3.connect(
+        path, timeout=SQLITE_TIMEOUT, isolation_level=None,
+        check_same_thread=False
+    )
+    apply_pragmas(db.cursor(), pragmas)
+    return db
+
+
+def create_database(path, pragmas):
+    db = connect(path, pragmas)
+    for statement in SCHEMA:
+        db.execute(statement)
+    db.execute('BEGIN')
+    db.executemany(
+        'INSERT INTO counter (author_id, posts) VALUES (?, 0)',
+        [(author,) for author in range(NUMBER_AUTHORS)]
+    )
+    db.executemany(
+        'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+        [
+            (number % NUMBER_AUTHORS, f'Запись {number}', number)
+            for number in range(NUMBER_SEED_POSTS)
+        ]
+    )
+    db.execute('COMMIT')
+    db.close()
+
+
+def write_post(db, number):
+    """Как post_create и add_comment: запись, комментарий и счетчик
+    автора в одной транзакции."""
+    author = number % NUMBER_AUTHORS
+    db.execute('BEGIN')
+    cursor = db.execute(
+        'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+        (author, f'Запись {number}', time.time())
+    )
+    db.execute(
+        'INSERT INTO comment (post_id, text, created) VALUES (?, ?, ?)',
+        (cursor.lastrowid, 'Комментарий', time.time())
+    )
+    db.execute(
+        'UPDATE counter SET posts = posts + 1 WHERE author_id = ?', (author,)
+    )
+    db.execute('COMMIT')
+
+
+def read_feed(db, number):
+    db.execute(FEED_QUERY).fetchall()
+
+
+def run_worker(path, pragmas, action, deadline, results):
+    db = connect(path, pragmas)
+    latencies = []
+    errors = 0
+    number = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            action(db, number)
+        except sqlite3.OperationalError:
+            errors += 1
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+        else:
+            latencies.append(time.perf_counter() - started)
+        number += 1
+    db.close()
+    results.append((latencies, errors))
+
+
+def run_load(pragmas, writers, readers, duration):
+    """Запускает параллельных писателей и читателей на временной БД
+    и возвращает для каждого вида нагрузки задержки и число ошибок."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'load.sqlite3')
+        create_database(path, pragmas)
+        deadline = time.monotonic() + duration
+        results = {write_post: [], read_feed: []}
+        threads = [
+            threading.Thread(
+                target=run_worker,
+                args=(path, pragmas, action, deadline, results[action])
+            )
+            for action, number in ((write_post, writers), (read_feed, readers))
+            for _ in range(number)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return {
+        action: (
+            [latency for latencies, _ in stats for latency in latencies],
+            sum(errors for _, errors in stats),
+        )
+        for action, stats in results.items()
+    }
+
+
+ACTIONS = (('запись', write_post), ('чтение', read_feed))
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: параллельные запись и чтение ленты '
+        'без настроек (журнал отката, без ожидания блокировки) '
+        'и с PRAGMA из SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5)
+
+    def handle(self, *args, **options):
+        modes = (
+            ('Без настроек', {}),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+        )
+        for title, pragmas in modes:
+            results = run_load(
+                pragmas, options['writers'], options['readers'],
+                options['duration']
+            )
+            self.stdout.write(title)
+            for name, action in ACTIONS:
+                latencies, errors = results[action]
+                self.stdout.write(self.format_stats(
+                    name, latencies, errors, options['duration']
+                ))
+
+    def format_stats(self, name, latencies, errors, duration):
+        if len(latencies) < 2:
+            return f'  {name}: операций {len(latencies)}, ошибок {errors}'
+        percentiles = statistics.quantiles(latencies, n=100)
+        return (
+            f'  {name}: {len(latencies) / duration:.0f} оп/с, '
+            f'ошибок {errors}, p50 {percentiles[49] * 1000:.2f} мс, '
+            f'p95 {percentiles[94] * 1000:.2f} мс, '
+            f'max {max(latencies) * 1000:.1f} мс'
+        )
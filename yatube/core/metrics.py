@@ -0,0 +1,189 @@
+"""Замеры запросов: число и время запросов к БД, попадания и промахи
+кэша, время отрисовки шаблонов.
+
+RequestMetricsMiddleware собирает замеры текущего запроса в RequestMetrics,
+передает их клиенту в заголовке Server-Timing и добавляет в гистограммы
+процесса по имени представления. Гистограммы отдает staff-пользователям
+страница /metrics/. Замеры дешевые: обертка запросов к БД и счетчики
+без записи текста SQL, поэтому их можно не отключать в production."""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+TIME_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+HISTOGRAMS = {
+    'total_ms': TIME_BUCKETS,
+    'db_ms': TIME_BUCKETS,
+    'template_ms': TIME_BUCKETS,
+    'queries': COUNT_BUCKETS,
+    'cache_hits': COUNT_BUCKETS,
+    'cache_misses': COUNT_BUCKETS,
+}
+MISSING = object()
+
+_state = threading.local()
+
+
+class RequestMetrics:
+    """Замеры одного запроса."""
+
+    __slots__ = (
+        'queries', 'db_time', 'cache_hits', 'cache_misses',
+        'template_time', 'template_depth', 'started',
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0
+        self.template_depth = 0
+        self.started = time.perf_counter()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def get_values(self):
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'db_ms': self.db_time * 1000,
+            'template_ms': self.template_time * 1000,
+            'queries': self.queries,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def start():
+    _state.metrics = RequestMetrics()
+    return _state.metrics
+
+
+def stop():
+    _state.metrics = None
+
+
+def get_current():
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(_state, 'metrics', None)
+
+
+def format_server_timing(values):
+    return (
+        f'db;dur={values["db_ms"]:.1f};desc="{values["queries"]} queries", '
+        f'cache;desc="{values["cache_hits"]} hits, '
+        f'{values["cache_misses"]} misses", '
+        f'tpl;dur={values["template_ms"]:.1f}, '
+        f'total;dur={values["total_ms"]:.1f}'
+    )
+
+
+class Histogram:
+    """Число наблюдений по корзинам: counts[i] - сколько значений
+    не больше buckets[i], последняя корзина - остальные."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        return {
+            'buckets': [*self.buckets, '+Inf'],
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': round(self.sum, 3),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+def record(view_name, values):
+    """Добавляет замеры запроса в гистограммы представления."""
+    with _lock:
+        histograms = _histograms.get(view_name)
+        if histograms is None:
+            histograms = _histograms[view_name] = {
+                name: Histogram(buckets)
+                for name, buckets in HISTOGRAMS.items()
+            }
+        for name, histogram in histograms.items():
+            histogram.observe(values[name])
+
+
+def get_histograms():
+    with _lock:
+        return {
+            view_name: {
+                name: histogram.to_dict()
+                for name, histogram in histograms.items()
+            }
+            for view_name, histograms in _histograms.items()
+        }
+
+
+def reset_histograms():
+    with _lock:
+        _histograms.clear()
+
+
+def count_cache_get(get):
+    def wrapper(key, default=None, version=None):
+        value = get(key, MISSING, version=version)
+        metrics = get_current()
+        if metrics is not None:
+            if value is MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is MISSING else value
+    return wrapper
+
+
+def count_cache_get_many(get_many):
+    def wrapper(keys, version=None):
+        keys = list(keys)
+        metrics = get_current()
+        # get_many по умолчанию вызывает get для каждого ключа,
+        # эти вызовы не считаются повторно.
+        _state.metrics = None
+        try:
+            values = get_many(keys, version=version)
+        finally:
+            _state.metrics = metrics
+        if metrics is not None:
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def instrument_caches():
+    """Считает попадания и промахи кэшей из CACHES. Объекты кэшей
+    свои у каждого потока, поэтому методы оборачиваются при первом
+    запросе потока."""
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if getattr(backend, '_metrics_instrumented', False):
+            continue
+        backend.get = count_cache_get(backend.get)
+        backend.get_many = count_cache_get_many(backend.get_many)
+        backend._metrics_instrumented = True
@@ -0,0 +1,66 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+PIN_COOKIE = 'pin_primary'
+
+
+class ReplicaPinningMiddleware:
+    """Читает из основной БД запросы, пришедшие в течение
+    REPLICA_PIN_SECONDS после записи этого же клиента."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        routers.reset(pinned=pinned_until > time.time())
+        try:
+            response = self.get_response(request)
+            if settings.DATABASE_REPLICAS and routers.has_written():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    str(time.time() + settings.REPLICA_PIN_SECONDS),
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True
+                )
+        finally:
+            routers.reset()
+        return response
+
+
+class RequestMetricsMiddleware:
+    """Считает запросы к БД, обращения к кэшу и время отрисовки шаблонов,
+    отдает их в заголовке Server-Timing и копит гистограммы по имени
+    представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.instrument_caches()
+        current = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(current.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        values = current.get_values()
+        response['Server-Timing'] = metrics.format_server_timing(values)
+        resolver_match = getattr(request, 'resolver_match', None)
+        metrics.record(
+            resolver_match.view_name if resolver_match else 'unresolved',
+            values
+        )
+        return response
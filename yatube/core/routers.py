@@ -0,0 +1,59 @@
+"""Маршрутизация запросов между основной БД и репликами для чтения.
+
+Чтение идет на случайную реплику из DATABASE_REPLICAS, запись - всегда
+в основную БД. После записи запрос закрепляется за основной БД, а
+middleware передает закрепление клиенту в cookie на REPLICA_PIN_SECONDS,
+чтобы пользователь сразу видел свои изменения, пока реплики отстают."""
+import random
+import threading
+import time
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def reset(pinned=False):
+    """Начинает новый запрос: закреплен ли он за основной БД."""
+    _state.pinned = pinned
+    _state.written = False
+    _state.replica_read = False
+    _state.started = time.time()
+
+
+def has_written():
+    return getattr(_state, 'written', False)
+
+
+def has_read_replica():
+    """Читал ли текущий запрос данные с реплики."""
+    return getattr(_state, 'replica_read', False)
+
+
+def get_started():
+    """Время начала текущего запроса."""
+    return getattr(_state, 'started', None) or time.time()
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False) or has_written()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if not settings.DATABASE_REPLICAS or is_pinned():
+            return 'default'
+        _state.replica_read = True
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной БД, связи между ними допустимы.
+        return True
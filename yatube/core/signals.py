@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(cursor, pragmas):
+    """Выполняет PRAGMA из словаря {имя: значение}."""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite: журнал WAL
+    позволяет читать во время записи, а busy_timeout заставляет
+    ждать освобождения блокировки вместо ошибки database is locked."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
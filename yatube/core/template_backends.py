@@ -0,0 +1,37 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    """Шаблон, время отрисовки которого попадает в замеры запроса."""
+
+    def render(self, context=None, request=None):
+        current = metrics.get_current()
+        if current is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        current.template_depth += 1
+        try:
+            return super().render(context, request)
+        finally:
+            current.template_depth -= 1
+            # Вложенные отрисовки уже входят во время внешней.
+            if not current.template_depth:
+                current.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который считает время отрисовки шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            super().from_string(template_code).template, self
+        )
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self
+        )
@@ -1,4 +1,34 @@
-from django.test import Client, TestCase
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Count, F, Max, Min
+from django.http import HttpResponseServerError
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from about.views import AboutTechView
+from posts.management.commands.seed_data import SEED_NOW, SEED_PERIOD
+from posts.models import Comment, Follow, Group, Post, User
+
+from . import metrics, routers
+from .cache_backends import CULL_CHECK_INTERVAL, FileBasedCache
+from .management.commands.sqlite_load_test import run_load
+
+REPLICA = 'replica'
 
 
 class CoreURLTests(TestCase):
@@ -12,3 +42,457 @@ class CoreURLTests(TestCase):
 
         response = self.guest_client.get('core.views.page_not_found')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLitePragmasTests(TestCase):
+    """Тестирует настройку соединений с SQLite."""
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_load_test_command(self):
+        """Нагрузочный тест выводит результаты обоих режимов,
+        с настройками - без ошибок блокировки."""
+        out = StringIO()
+        call_command(
+            'sqlite_load_test', writers=1, readers=1, duration=0.2, stdout=out
+        )
+        baseline, tuned = out.getvalue().split('SQLITE_PRAGMAS')
+        self.assertIn('Без настроек', baseline)
+        self.assertEqual(tuned.count('ошибок 0'), 2)
+
+    def test_pragmas_beat_baseline(self):
+        """С SQLITE_PRAGMAS ошибок блокировки меньше или операций
+        больше, чем у SQLite по умолчанию."""
+        results = {
+            title: run_load(pragmas, writers=2, readers=4, duration=0.5)
+            for title, pragmas in (
+                ('baseline', {}), ('tuned', settings.SQLITE_PRAGMAS)
+            )
+        }
+        errors = {
+            title: sum(errors for _, errors in result.values())
+            for title, result in results.items()
+        }
+        operations = {
+            title: sum(len(latencies) for latencies, _ in result.values())
+            for title, result in results.items()
+        }
+        self.assertTrue(
+            errors['tuned'] < errors['baseline']
+            or operations['tuned'] > operations['baseline'],
+            (errors, operations)
+        )
+
+
+# Сервер для проверки http_load_test: отвечает 200 на любой GET.
+STUB_SERVER = """
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+ThreadingHTTPServer(('127.0.0.1', int(sys.argv[1])), Handler).serve_forever()
+"""
+
+
+class HTTPLoadTestTests(TestCase):
+    """Тестирует запуск сервера командой http_load_test."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='Elena')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        Post.objects.create(text='Запись', author=author, group=group)
+
+    def get_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def test_missing_server(self):
+        """Отсутствующий сервер дает понятную ошибку команды."""
+        with self.assertRaisesMessage(CommandError, 'yatube-no-server'):
+            call_command(
+                'http_load_test', server='yatube-no-server {port}',
+                port=self.get_port(), duration=0.1, stdout=StringIO()
+            )
+
+    @mock.patch(
+        'core.management.commands.http_load_test.WARMUP_DURATION', 0.01
+    )
+    def test_smoke(self):
+        """Команда запускает сервер с обоими профилями и сравнивает их."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        script = os.path.join(directory, 'server.py')
+        with open(script, 'w') as stream:
+            stream.write(STUB_SERVER)
+        out = StringIO()
+        call_command(
+            'http_load_test', server=f'{sys.executable} {script} {{port}}',
+            port=self.get_port(), concurrency=1, duration=0.1, stdout=out
+        )
+        output = out.getvalue()
+        self.assertIn('production / development:', output)
+        for client in ('anonymous', 'uncached', 'user'):
+            self.assertIn(f'  {client} ', output)
+        self.assertFalse(Session.objects.exists())
+
+
+class ProductionSettingsTests(TestCase):
+    """Тестирует production-профиль настроек."""
+
+    def test_secret_key_is_required(self):
+        """Без DJANGO_SECRET_KEY production-профиль не запускается."""
+        environ = {**os.environ, 'YATUBE_PROFILE': 'production'}
+        environ.pop('DJANGO_SECRET_KEY', None)
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'check'], cwd=settings.BASE_DIR,
+            env=environ, capture_output=True, text=True
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('DJANGO_SECRET_KEY', result.stderr)
+
+
+class FileBasedCacheTests(TestCase):
+    """Тестирует файловый кэш с атомарным incr."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_parallel_incr_returns_unique_values(self):
+        """Параллельные incr из разных экземпляров кэша, как из разных
+        процессов, не теряют увеличений."""
+        FileBasedCache(self.directory, {}).add('counter', 0, None)
+        values = []
+
+        def increment():
+            backend = FileBasedCache(self.directory, {})
+            for _ in range(50):
+                values.append(backend.incr('counter'))
+
+        threads = [threading.Thread(target=increment) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(values), list(range(1, 401)))
+
+    def test_cull_checks_are_amortized(self):
+        """Каталог перебирается раз в CULL_CHECK_INTERVAL записей,
+        а переполненный кэш при проверке сокращается."""
+        backend = FileBasedCache(
+            self.directory, {'OPTIONS': {'MAX_ENTRIES': 10}}
+        )
+        with mock.patch.object(
+            backend, '_list_cache_files', wraps=backend._list_cache_files
+        ) as list_files:
+            for number in range(2 * CULL_CHECK_INTERVAL):
+                backend.set(f'key:{number}', number)
+        self.assertEqual(list_files.call_count, 2)
+        self.assertLess(
+            len(backend._list_cache_files()), 2 * CULL_CHECK_INTERVAL
+        )
+
+
+class RequestMetricsTests(TestCase):
+    """Тестирует замеры запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='Elena')
+        cls.staff = User.objects.create(username='admin', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        Post.objects.create(text='Запись', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset_histograms()
+        self.url = reverse('posts:group_list', kwargs={'slug': 'test-group'})
+
+    def get_timing(self, response):
+        return {
+            item.split(';')[0]: item
+            for item in response['Server-Timing'].split(', ')
+        }
+
+    def test_server_timing(self):
+        """Заголовок Server-Timing содержит замеры БД, кэша и шаблонов."""
+        client = Client()
+        client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(timing, r'cache;desc="\d+ hits, [1-9]\d* misses"')
+        self.assertRegex(timing, r'tpl;dur=\d+\.\d')
+        self.assertNotIn('tpl;dur=0.0', timing)
+
+    def test_cache_hits_counted(self):
+        """Повторный запрос анонимной страницы попадает в кэш."""
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+        self.assertRegex(
+            response['Server-Timing'], r'cache;desc="[1-9]\d* hits, 0 misses"'
+        )
+
+    def test_histograms(self):
+        """Замеры копятся по представлениям и доступны только staff."""
+        for _ in range(3):
+            self.client.get(self.url)
+        client = Client()
+        response = client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        client.force_login(self.staff)
+        histograms = client.get(reverse('metrics')).json()
+        total = histograms['posts:group_list']['total_ms']
+        self.assertEqual(total['count'], 3)
+        self.assertEqual(sum(total['counts']), 3)
+        self.assertEqual(len(total['counts']), len(total['buckets']))
+
+
+class BenchmarkTests(TestCase):
+    """Тестирует заполнение БД и замеры страниц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', users=30, groups=3, follows=100, posts=200,
+            comments=300, stdout=StringIO(), verbosity=0
+        )
+
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+
+    def test_seed_data(self):
+        """Заполнение создает данные со степенным распределением."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        top = Post.objects.values('author').annotate(
+            total=Count('pk')
+        ).order_by('-total').first()
+        self.assertGreater(top['total'], 200 / 30 * 2)
+        dates = Post.objects.aggregate(
+            first=Min('pub_date'), last=Max('pub_date')
+        )
+        self.assertLessEqual(dates['last'], SEED_NOW)
+        self.assertGreaterEqual(dates['first'], SEED_NOW - SEED_PERIOD)
+
+    def test_benchmark_covers_all_urls(self):
+        """Замеры пишутся в JSON для каждой страницы и клиента."""
+        output = os.path.join(self.results_dir, 'results.json')
+        call_command(
+            'benchmark', iterations=2, warmup=0, output=output,
+            stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as stream:
+            report = json.load(stream)
+        self.assertEqual(report['data']['posts'], 200)
+        names = {result['name'] for result in report['results']}
+        self.assertIn('posts:posts_list', names)
+        self.assertIn('users:password_reset_confirm', names)
+        self.assertIn('about:tech', names)
+        self.assertEqual(len(report['results']), len(names) * 2)
+        self.assertTrue(all(
+            result['status'] < 400 for result in report['results']
+        ))
+
+    def test_benchmark_keeps_data_and_cache(self):
+        """Замеры не меняют подписки и не очищают общий кэш."""
+        follows = set(Follow.objects.values_list('user', 'author'))
+        cache.set('benchmark-test', 'kept')
+        output = os.path.join(self.results_dir, 'results.json')
+        call_command(
+            'benchmark', iterations=1, warmup=0, output=output,
+            stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as stream:
+            names = {result['name'] for result in json.load(stream)['results']}
+        self.assertNotIn('posts:profile_follow', names)
+        self.assertNotIn('users:logout', names)
+        self.assertEqual(
+            set(Follow.objects.values_list('user', 'author')), follows
+        )
+        self.assertEqual(cache.get('benchmark-test'), 'kept')
+
+    def test_benchmark_compare(self):
+        """Рост числа запросов к БД считается регрессией."""
+        output = os.path.join(self.results_dir, 'results.json')
+        call_command(
+            'benchmark', iterations=2, warmup=0, output=output,
+            stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as stream:
+            report = json.load(stream)
+        for result in report['results']:
+            result['p95_ms'] = 10 ** 6
+        report['results'][0]['queries'] = -1
+        with open(output, 'w', encoding='utf-8') as stream:
+            json.dump(report, stream)
+        with self.assertRaisesMessage(CommandError, 'posts:posts_list'):
+            call_command(
+                'benchmark', iterations=2, warmup=0, compare=output,
+                stdout=StringIO()
+            )
+
+    def test_benchmark_status_change(self):
+        """Другой статус ответа, чем в прошлом запуске, - регрессия."""
+        output = os.path.join(self.results_dir, 'results.json')
+        call_command(
+            'benchmark', iterations=1, warmup=0, output=output,
+            stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as stream:
+            report = json.load(stream)
+        for result in report['results']:
+            result['p95_ms'] = 10 ** 6
+            if result['name'] == 'about:tech':
+                result['status'] = 302
+        with open(output, 'w', encoding='utf-8') as stream:
+            json.dump(report, stream)
+        with self.assertRaisesMessage(CommandError, 'статус 302 -> 200'):
+            call_command(
+                'benchmark', iterations=1, warmup=0, compare=output,
+                stdout=StringIO()
+            )
+
+    @mock.patch.object(
+        AboutTechView, 'get',
+        lambda *args, **kwargs: HttpResponseServerError()
+    )
+    def test_benchmark_fails_on_error_status(self):
+        """Страница с ошибкой проваливает замеры."""
+        with self.assertRaisesMessage(CommandError, 'about:tech (user): 500'):
+            call_command(
+                'benchmark', iterations=1, warmup=0, stdout=StringIO()
+            )
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TestCase):
+    """Тестирует чтение из реплики. Репликой служит отдельный файл
+    SQLite, данные в который копируются вручную."""
+
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            **connections.databases['default'],
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+        cls.user = User.objects.create(username='Elena')
+        cls.group = Group.objects.create(
+            title='Основная БД',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        # На реплике у сообщества другое название, чтобы отличать
+        # ответы; bulk_create не вызывает сигналы.
+        Group.objects.using(REPLICA).bulk_create([Group(
+            pk=cls.group.pk,
+            title='Реплика',
+            slug=cls.group.slug,
+            description=cls.group.description,
+        )])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        # Пользователь и сессия попадают на реплику, как при репликации.
+        User.objects.using('default').get().save(using=REPLICA)
+        Session.objects.get().save(using=REPLICA)
+        routers.reset()
+        self.group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}
+        )
+
+    def test_router(self):
+        """Чтение идет на реплику, запись и последующее чтение - в основную."""
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), REPLICA)
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        group = Group.objects.using(REPLICA).get()
+        self.assertEqual(router.db_for_read(Post, instance=group), REPLICA)
+
+    def test_reads_use_replica(self):
+        """Страницы читают данные из реплики."""
+        for client in (self.client, self.authorized_client):
+            with self.subTest(client=client):
+                response = client.get(self.group_url)
+                self.assertContains(response, 'Реплика')
+
+    def test_reads_pinned_after_write(self):
+        """После создания записи клиент читает из основной БД."""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Новая запись'}
+        )
+        self.assertTrue(Post.objects.using('default').exists())
+        self.assertIn('pin_primary', response.cookies)
+        response = self.authorized_client.get(self.group_url)
+        self.assertContains(response, 'Основная БД')
+        self.assertContains(self.client.get(self.group_url), 'Реплика')
+
+    def test_lagging_replica_is_not_cached(self):
+        """Страница, прочитанная с отстающей реплики сразу после
+        изменения, не кэшируется под новой версией тегов."""
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.client.get(self.group_url)
+        self.assertContains(response, 'Реплика')
+        self.assertFalse(response.has_header('ETag'))
+        # Реплика догнала основную БД.
+        Group.objects.using(REPLICA).filter(pk=self.group.pk).update(
+            title='Новое название'
+        )
+        response = self.client.get(self.group_url)
+        self.assertContains(response, 'Новое название')
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            response = self.client.get(self.group_url)
+        self.assertTrue(response.has_header('ETag'))
+        Group.objects.using(REPLICA).filter(pk=self.group.pk).update(
+            title='Кэш'
+        )
+        self.assertContains(self.client.get(self.group_url), 'Новое название')
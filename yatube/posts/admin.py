@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import search_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -12,6 +13,12 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     list_editable = ('group',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет записи по полнотекстовому индексу, а не через LIKE."""
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     """Класс для работы с сообществами в админ-панели."""
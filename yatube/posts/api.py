@@ -0,0 +1,135 @@
+"""JSON API лент только для чтения, версия v1.
+
+Ленты строятся теми же выборками, что и HTML-страницы, и отдаются
+страницами по токену ?after=. Ответы поддерживают условные запросы:
+пока лента не изменилась, клиент получает 304 без сериализации
+(см. caching.conditional_page)."""
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from .caching import (FEED_TAG, add_cache_tags, add_last_modified,
+                      author_tag, cache_anonymous_page, conditional_page,
+                      follower_tag, get_page_dates, get_page_tags, group_tag,
+                      post_tag)
+from .models import Group, Post, User
+from .sharding import for_author, get_post, sharded
+from .timeline import TIMELINE_ORDERING, get_timeline
+from .utils import CURSOR_ORDERING, get_comments_page, get_cursor_page
+
+
+def error_response(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def get_next_url(request, page):
+    if not page.has_next():
+        return None
+    return f'{request.path}?after={page.next_cursor}'
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'comments_count': post.comments_count,
+        'latest_comments': [
+            serialize_comment(comment) for comment in post.latest_comments
+        ],
+    }
+
+
+def feed_response(request, posts, *tags, ordering=CURSOR_ORDERING):
+    """Страница ленты в JSON. Теги и даты страницы отмечаются
+    для кэширования и условных запросов."""
+    page = get_cursor_page(request, posts, ordering)
+    add_cache_tags(request, *tags, *get_page_tags(page))
+    add_last_modified(request, *get_page_dates(page))
+    return JsonResponse({
+        'results': [serialize_post(post) for post in page],
+        'next': get_next_url(request, page),
+    })
+
+
+@require_safe
+@conditional_page
+@cache_anonymous_page
+def index(request):
+    """Лента всех записей."""
+    return feed_response(request, sharded(Post.objects.feed()), FEED_TAG)
+
+
+@require_safe
+@conditional_page
+@cache_anonymous_page
+def group_posts(request, slug):
+    """Записи сообщества."""
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error_response('Сообщество не найдено.', 404)
+    return feed_response(
+        request, sharded(Post.objects.feed()).filter(group=group),
+        group_tag(group.pk)
+    )
+
+
+@require_safe
+@conditional_page
+@cache_anonymous_page
+def profile(request, username):
+    """Записи автора."""
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        return error_response('Автор не найден.', 404)
+    return feed_response(
+        request, for_author(Post.objects.feed(), user.pk).filter(author=user),
+        author_tag(user.pk)
+    )
+
+
+@require_safe
+@conditional_page
+def follow_index(request):
+    """Записи авторов, на которых подписан пользователь."""
+    if not request.user.is_authenticated:
+        return error_response('Требуется авторизация.', 401)
+    return feed_response(
+        request, get_timeline(request.user),
+        FEED_TAG, follower_tag(request.user.pk), ordering=TIMELINE_ORDERING
+    )
+
+
+@require_safe
+@conditional_page
+@cache_anonymous_page
+def post_detail(request, post_id):
+    """Запись со страницей комментариев от старых к новым."""
+    post = get_post(Post.objects.feed(), post_id)
+    if post is None:
+        return error_response('Запись не найдена.', 404)
+    comments = get_comments_page(
+        request, post.comments.select_related('author')
+    )
+    add_cache_tags(request, post_tag(post.pk), author_tag(post.author_id))
+    if post.group_id:
+        add_cache_tags(request, group_tag(post.group_id))
+    add_last_modified(
+        request, post.pub_date, *(comment.created for comment in comments)
+    )
+    return JsonResponse({
+        'post': serialize_post(post),
+        'comments': [serialize_comment(comment) for comment in comments],
+        'next': get_next_url(request, comments),
+    })
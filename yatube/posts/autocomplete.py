@@ -0,0 +1,165 @@
+"""Подсказки при вводе: поиск сообществ и авторов по началу слова.
+
+Индекс - отсортированный в памяти список ключей (slug и название
+сообщества, имя пользователя), префикс ищется двоичным поиском,
+поэтому запрос подсказки не обращается к БД. Индекс строится при первом
+запросе. Сигналы при сохранении сообществ и пользователей публикуют
+изменения в кэш под последовательными номерами, и индекс каждого
+процесса применяет пропущенные изменения перед поиском. Индекс
+перестраивается целиком, только если изменения из кэша пропали или
+сменилось поколение - версия тега AUTOCOMPLETE_TAG, которую сбрасывает
+массовая загрузка данных."""
+import threading
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .caching import get_tag_versions
+from .models import Group, User
+
+AUTOCOMPLETE_TAG = 'autocomplete'
+AUTOCOMPLETE_LIMIT = 10
+CHANGE_TIMEOUT = 60 * 60
+SEQUENCE_KEY = 'autocomplete:{}:sequence'
+CHANGE_KEY = 'autocomplete:{}:{}'
+GROUP = 'group'
+USER = 'user'
+
+
+def get_entries(kind, obj):
+    """Строки индекса (ключ, тип, id, подпись, адрес) для объекта."""
+    if kind == GROUP:
+        url = reverse('posts:group_list', kwargs={'slug': obj.slug})
+        keys = {obj.slug.lower(), obj.title.lower()}
+        return [(key, GROUP, obj.pk, obj.title, url) for key in keys]
+    if not obj.is_active:
+        return []
+    url = reverse('posts:profile', kwargs={'username': obj.username})
+    return [(obj.username.lower(), USER, obj.pk, obj.username, url)]
+
+
+def get_generation():
+    return get_tag_versions([AUTOCOMPLETE_TAG], create=True)[
+        AUTOCOMPLETE_TAG
+    ]
+
+
+def get_sequence(generation):
+    """Номер последнего опубликованного изменения поколения."""
+    return cache.get(SEQUENCE_KEY.format(generation), 0)
+
+
+class PrefixIndex:
+    """Отсортированный индекс префиксов.
+    Изменения создают новый список, поэтому чтение не требует блокировок."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._position = 0
+        self._entries = []
+        self._keys = []
+
+    def build(self):
+        entries = []
+        for group in Group.objects.only('slug', 'title'):
+            entries += get_entries(GROUP, group)
+        for user in User.objects.filter(is_active=True).only(
+            'username', 'is_active'
+        ):
+            entries += get_entries(USER, user)
+        return entries
+
+    def _swap(self, entries):
+        entries.sort()
+        self._entries = entries
+        self._keys = [entry[0] for entry in entries]
+
+    def _rebuild(self, generation):
+        # Номер читается до построения: изменения, опубликованные
+        # во время построения, применятся повторно, это безопасно.
+        position = get_sequence(generation)
+        self._swap(self.build())
+        self._generation = generation
+        self._position = position
+
+    def _apply_changes(self, generation, sequence):
+        """Применяет изменения с номерами после _position.
+        Возвращает False, если часть изменений пропала из кэша."""
+        keys = [
+            CHANGE_KEY.format(generation, number)
+            for number in range(self._position + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        # Для каждого объекта важна только последняя версия его строк.
+        latest = {}
+        for key in keys:
+            kind, pk, new_entries = changes[key]
+            latest[kind, pk] = new_entries
+        entries = [
+            entry for entry in self._entries if entry[1:3] not in latest
+        ]
+        for new_entries in latest.values():
+            entries += new_entries
+        self._swap(entries)
+        self._position = sequence
+        return True
+
+    def ensure_fresh(self):
+        """Догоняет изменения других процессов или перестраивает индекс."""
+        generation = get_generation()
+        sequence = get_sequence(generation)
+        if generation == self._generation and sequence == self._position:
+            return
+        with self._lock:
+            sequence = get_sequence(generation)
+            if generation != self._generation:
+                self._rebuild(generation)
+            elif sequence < self._position:
+                # Счетчик изменений пропал из кэша и начат заново.
+                self._rebuild(generation)
+            elif sequence > self._position:
+                if not self._apply_changes(generation, sequence):
+                    self._rebuild(generation)
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """Объекты, один из ключей которых начинается с prefix."""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        entries, keys = self._entries, self._keys
+        results = []
+        seen = set()
+        position = bisect_left(keys, prefix)
+        while (
+            position < len(keys)
+            and keys[position].startswith(prefix)
+            and len(results) < limit
+        ):
+            _, kind, pk, label, url = entries[position]
+            position += 1
+            if (kind, pk) in seen:
+                continue
+            seen.add((kind, pk))
+            results.append({'type': kind, 'label': label, 'url': url})
+        return results
+
+    def update(self, kind, obj, removed=False):
+        """Публикует новые строки объекта для индексов всех процессов.
+        Индекс этого процесса применит их при следующем поиске."""
+        generation = get_generation()
+        sequence_key = SEQUENCE_KEY.format(generation)
+        cache.add(sequence_key, 0, None)
+        sequence = cache.incr(sequence_key)
+        cache.set(
+            CHANGE_KEY.format(generation, sequence),
+            (kind, obj.pk, [] if removed else get_entries(kind, obj)),
+            CHANGE_TIMEOUT
+        )
+
+
+index = PrefixIndex()
@@ -0,0 +1,244 @@
+"""Потоковые выгрузка и загрузка данных в NDJSON и CSV.
+
+Выгрузка читает таблицу итератором по первичному ключу и сразу пишет
+строки в поток, загрузка читает поток пачками по batch_size и вставляет
+их одним запросом на пачку, поэтому память не зависит от объема данных.
+Сигналы при загрузке не вызываются: кэш, ленты подписок и копии на
+шардах обновляются для каждой пачки, а счетчики и поисковый индекс
+нужно пересчитать после загрузки. Загружайте данные в порядке KINDS,
+чтобы внешние ключи ссылались на уже загруженные строки: комментарии
+к записям, которых нет ни на одном шарде, пропускаются и попадают
+в отчет о загрузке. Строки с пустыми обязательными полями или неверными
+значениями тоже пропускаются и попадают в отчет: вставка игнорирует
+конфликты, и без проверки такие строки пропали бы молча."""
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import AutoField
+from django.utils import timezone
+
+from . import autocomplete, timeline
+from .caching import (FEED_TAG, follower_tag, get_instance_tags,
+                      invalidate_tags, post_tag)
+from .models import Comment, Follow, Group, Post, User
+from .sharding import get_post_databases, get_shard, get_shards, is_sharded
+
+BATCH_SIZE = 1000
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+KINDS = {
+    'users': (User, (
+        'id', 'username', 'first_name', 'last_name', 'email', 'password',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    )),
+    'groups': (Group, ('id', 'title', 'slug', 'description')),
+    'posts': (Post, ('id', 'text', 'pub_date', 'author', 'group', 'image')),
+    'comments': (Comment, ('id', 'post', 'author', 'text', 'created')),
+    'follows': (Follow, ('id', 'user', 'author')),
+}
+
+
+def get_fields(kind):
+    model, names = KINDS[kind]
+    return [model._meta.get_field(name) for name in names]
+
+
+def get_databases(model):
+    """БД, из которых выгружаются строки модели."""
+    if model in (Post, Comment):
+        return get_post_databases()
+    return ['default']
+
+
+def export_rows(kind, chunk_size=BATCH_SIZE):
+    """Строки таблицы в виде словарей {поле: значение для JSON}."""
+    model, names = KINDS[kind]
+    fields = get_fields(kind)
+    attnames = [field.attname for field in fields]
+    for alias in get_databases(model):
+        rows = model._base_manager.using(alias).order_by('pk').values_list(
+            *attnames
+        ).iterator(chunk_size=chunk_size)
+        for row in rows:
+            yield {
+                name: value.isoformat() if hasattr(value, 'isoformat')
+                else value
+                for name, value in zip(names, row)
+            }
+
+
+def write_rows(rows, stream, file_format, kind):
+    """Пишет строки в поток, возвращает их число."""
+    count = 0
+    if file_format == CSV:
+        writer = csv.DictWriter(stream, KINDS[kind][1])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def read_rows(stream, file_format):
+    """Читает строки из потока как словари."""
+    if file_format == CSV:
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def build_object(model, fields, row, from_csv):
+    """Объект из строки файла. Даты без часового пояса, например
+    только дата, считаются датами текущего пояса. Пустое обязательное
+    поле без значения по умолчанию и неверное значение дают
+    ValidationError."""
+    values = {}
+    for field in fields:
+        value = row.get(field.name)
+        if from_csv and value == '' and (field.null or field.primary_key):
+            value = None
+        if value is not None:
+            target = field.target_field if field.is_relation else field
+            value = target.to_python(value)
+            if (
+                isinstance(value, datetime) and settings.USE_TZ
+                and timezone.is_naive(value)
+            ):
+                value = timezone.make_aware(value)
+        elif not field.null and not field.primary_key:
+            if not field.has_default() and not field.empty_strings_allowed:
+                raise ValidationError(f'Не заполнено поле {field.name}.')
+            value = field.get_default()
+        values[field.attname] = value
+    return model(**values)
+
+
+def insert_objects(model, objects, using):
+    """Вставляет объекты как есть, как bulk_create с ignore_conflicts.
+    Вставка идет в режиме raw, как при loaddata: поля с auto_now_add
+    сохраняют даты из файла, а не получают текущее время."""
+    queryset = model._base_manager.using(using)
+    fields = model._meta.concrete_fields
+    with_pk = [obj for obj in objects if obj.pk is not None]
+    without_pk = [obj for obj in objects if obj.pk is None]
+    for batch, batch_fields in (
+        (with_pk, fields),
+        (without_pk, [
+            field for field in fields if not isinstance(field, AutoField)
+        ]),
+    ):
+        if not batch:
+            continue
+        batch_size = max(
+            connections[using].ops.bulk_batch_size(batch_fields, batch), 1
+        )
+        for start in range(0, len(batch), batch_size):
+            queryset._insert(
+                batch[start:start + batch_size], fields=batch_fields,
+                raw=True, using=using, ignore_conflicts=True
+            )
+
+
+def get_target_databases(model, objects):
+    """Раскладывает объекты по БД, в которых они хранятся."""
+    if not is_sharded():
+        return {'default': objects}
+    if model in (User, Group):
+        return {alias: objects for alias in ['default'] + get_shards()}
+    if model is Post:
+        targets = {}
+        for obj in objects:
+            targets.setdefault(get_shard(obj.author_id), []).append(obj)
+        return targets
+    if model is Comment:
+        post_ids = {obj.post_id for obj in objects}
+        post_dbs = {}
+        for alias in get_shards():
+            for pk in Post.objects.using(alias).filter(
+                pk__in=post_ids
+            ).values_list('pk', flat=True):
+                post_dbs[pk] = alias
+        targets = {}
+        for obj in objects:
+            if obj.post_id in post_dbs:
+                targets.setdefault(post_dbs[obj.post_id], []).append(obj)
+        return targets
+    return {'default': objects}
+
+
+def get_batch_tags(model, objects):
+    tags = set()
+    if model is Post:
+        tags.add(FEED_TAG)
+    if model in (User, Group):
+        tags.add(autocomplete.AUTOCOMPLETE_TAG)
+    for obj in objects:
+        if model is Comment:
+            tags.add(post_tag(obj.post_id))
+        elif model is Follow:
+            tags.add(follower_tag(obj.user_id))
+        else:
+            tags.update(get_instance_tags(obj))
+    return tags
+
+
+def save_batch(model, objects):
+    """Сохраняет пачку объектов и возвращает число пропущенных: с шардами
+    это комментарии к записям, которых нет ни на одном шарде. Строки
+    с уже существующими ключами пропускаются, поэтому загрузку можно
+    повторить."""
+    if model is Post:
+        timeline.set_pulled(objects)
+    targets = get_target_databases(model, objects)
+    for alias, batch in targets.items():
+        with transaction.atomic(using=alias):
+            insert_objects(model, batch, alias)
+    if model is Post:
+        timeline.fan_out_many(objects)
+    elif model is Follow:
+        for follow in objects:
+            timeline.backfill(follow)
+    invalidate_tags(*get_batch_tags(model, objects))
+    if model is Comment and is_sharded():
+        return len(objects) - sum(len(batch) for batch in targets.values())
+    return 0
+
+
+def import_rows(kind, rows, from_csv=False, batch_size=BATCH_SIZE, skip=0,
+                on_batch=None):
+    """Загружает строки пачками, пропустив первые skip строк.
+    После каждой пачки вызывает on_batch(число обработанных строк,
+    число пропущенных с начала загрузки строк, см. save_batch,
+    число некорректных строк, см. build_object)."""
+    model = KINDS[kind][0]
+    fields = get_fields(kind)
+    rows = islice(rows, skip, None)
+    position = skip
+    skipped = invalid = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return position
+        objects = []
+        for row in batch:
+            try:
+                objects.append(build_object(model, fields, row, from_csv))
+            except ValidationError:
+                invalid += 1
+        if objects:
+            skipped += save_batch(model, objects)
+        position += len(batch)
+        if on_batch is not None:
+            on_batch(position, skipped, invalid)
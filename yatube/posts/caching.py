@@ -0,0 +1,311 @@
+"""Кэширование с инвалидацией по тегам.
+
+У каждого тега ('posts', 'post:1', 'author:1', 'group:1') в кэше хранится
+версия. Запись кэша запоминает версии своих тегов и считается устаревшей,
+как только версия любого из них изменилась. Версии читаются до того, как
+страница выведет данные: теги устаревшей записи - перед вызовом view,
+новые теги - в момент, когда view или шаблон их отмечает. Если во время
+рендеринга версия изменилась, результат не кэшируется, иначе старые
+данные сохранились бы под новой версией.
+Версии сбрасываются сигналами при изменении записей, комментариев
+и сообществ. Тег 'posts' меняется только при появлении и удалении
+записей, правка записи сбрасывает лишь ее собственные теги.
+
+Те же теги служат для условных GET-запросов: ETag страницы строится
+по версиям ее тегов и меняется вместе с ними.
+
+Версия хранит время, когда она назначена. Реплики отстают от основной
+БД, поэтому страница, прочитанная с реплики раньше чем через
+REPLICA_PIN_SECONDS после назначения версии, могла вывести старые
+данные и под новой версией не кэшируется."""
+import calendar
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date
+
+from core import routers
+
+from .models import Group, Post, User
+
+PAGE_CACHE_TIMEOUT = 60 * 15
+PAGE_KEY = 'page:{}'
+ETAG_KEY = 'etag:{}'
+TAG_KEY = 'tag:{}'
+FEED_TAG = 'posts'
+
+
+def post_tag(pk):
+    return f'post:{pk}'
+
+
+def author_tag(pk):
+    return f'author:{pk}'
+
+
+def group_tag(pk):
+    return f'group:{pk}'
+
+
+def follower_tag(pk):
+    return f'follower:{pk}'
+
+
+def get_tag_versions(tags, create=False):
+    """Возвращает текущие версии тегов.
+    С create=True отсутствующим тегам назначается новая версия."""
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = {
+        keys[key]: version for key, version in cache.get_many(keys).items()
+    }
+    if create:
+        missing = {
+            TAG_KEY.format(tag): f'{time.time():.6f}:{uuid.uuid4().hex}'
+            for tag in keys.values() if tag not in versions
+        }
+        cache.set_many(missing, None)
+        versions.update(
+            (keys[key], version) for key, version in missing.items()
+        )
+    return versions
+
+
+class TagVersions(dict):
+    """Версии отмеченных тегов страницы или фрагмента.
+
+    Версии тегов устаревшей записи кэша читаются заранее через prefetch,
+    до рендеринга, и при отметке тега берутся оттуда. Остальные теги
+    читаются или создаются при отметке."""
+
+    def __init__(self):
+        super().__init__()
+        self.prefetched = {}
+
+    def add(self, versions):
+        """Добавляет версии вложенного фрагмента, не меняя версий,
+        отмеченных раньше."""
+        for tag, version in versions.items():
+            self.setdefault(tag, version)
+
+    def prefetch(self, tags):
+        self.prefetched.update(get_tag_versions(tags, create=True))
+
+    def track(self, tags):
+        missing = []
+        for tag in tags:
+            if tag in self:
+                continue
+            if tag in self.prefetched:
+                self[tag] = self.prefetched[tag]
+            else:
+                missing.append(tag)
+        if missing:
+            self.update(get_tag_versions(missing, create=True))
+
+
+def is_current(versions):
+    """Не изменилась ли версия ни одного из тегов."""
+    return get_tag_versions(versions) == versions
+
+
+def get_version_time(version):
+    """Время назначения версии, для версий без времени - 0."""
+    created, separator, _ = version.partition(':')
+    return float(created) if separator else 0
+
+
+def is_settled(versions):
+    """Можно ли кэшировать результат с версиями тегов: данные прочитаны
+    из основной БД или реплики успели получить изменения, после
+    которых версии назначены."""
+    if not routers.has_read_replica():
+        return True
+    settled = routers.get_started() - settings.REPLICA_PIN_SECONDS
+    return all(
+        get_version_time(version) <= settled
+        for version in versions.values()
+    )
+
+
+def invalidate_tags(*tags):
+    """Делает устаревшими все записи кэша, зависящие от тегов."""
+    cache.delete_many([TAG_KEY.format(tag) for tag in tags])
+
+
+def add_cache_tags(request, *tags):
+    """Отмечает, от каких тегов зависит кэшируемая страница."""
+    cache_tags = getattr(request, 'cache_tags', None)
+    if cache_tags is not None:
+        cache_tags.track(tags)
+
+
+def add_last_modified(request, *dates):
+    """Отмечает даты изменения страницы, в Last-Modified попадет
+    самая поздняя из них."""
+    dates = [date for date in dates if date is not None]
+    last_modified = getattr(request, 'last_modified', None)
+    if last_modified is not None:
+        dates.append(last_modified)
+    request.last_modified = max(dates, default=None)
+
+
+def get_timestamp(date):
+    if date is None:
+        return None
+    return calendar.timegm(date.utctimetuple())
+
+
+def get_page_dates(posts):
+    """Даты публикации записей ленты и их последних комментариев."""
+    dates = []
+    for post in posts:
+        dates.append(post.pub_date)
+        dates += [
+            comment.created
+            for comment in getattr(post, 'latest_comments', ())
+        ]
+    return dates
+
+
+def get_instance_tags(obj):
+    """Теги, от которых зависит вывод записи, автора или сообщества.
+    Строка считается готовым тегом."""
+    if isinstance(obj, str):
+        return {obj}
+    if isinstance(obj, Post):
+        tags = {post_tag(obj.pk), author_tag(obj.author_id)}
+        if obj.group_id:
+            tags.add(group_tag(obj.group_id))
+        return tags
+    if isinstance(obj, Group):
+        return {group_tag(obj.pk)}
+    if isinstance(obj, User):
+        return {author_tag(obj.pk)}
+    return set()
+
+
+def get_page_tags(posts):
+    """Теги записей и сообществ, которые выводит лента."""
+    tags = set()
+    for post in posts:
+        tags.update(get_instance_tags(post))
+    return tags
+
+
+def cache_anonymous_page(view):
+    """Кэширует страницу целиком для анонимных пользователей.
+
+    Ключ строится по пути с параметрами запроса. Страница кэшируется,
+    только если view отметила ее теги через add_cache_tags. Вместе
+    со страницей сохраняется Last-Modified, чтобы conditional_page
+    построил заголовки и без своей записи в кэше."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated
+        ):
+            return view(request, *args, **kwargs)
+        key = PAGE_KEY.format(
+            md5(request.get_full_path().encode()).hexdigest()
+        )
+        if getattr(request, 'cache_tags', None) is None:
+            request.cache_tags = TagVersions()
+        entry = cache.get(key)
+        if entry is not None:
+            response, versions = entry
+            if is_current(versions):
+                request.cache_tags.add(versions)
+                if response.has_header('Last-Modified'):
+                    add_last_modified(request, datetime.fromtimestamp(
+                        parse_http_date(response['Last-Modified']),
+                        timezone.utc
+                    ))
+                return response
+            request.cache_tags.prefetch(versions)
+        response = view(request, *args, **kwargs)
+        if (
+            response.status_code == 200
+            and request.cache_tags
+            and not response.cookies
+            and is_current(request.cache_tags)
+            and is_settled(request.cache_tags)
+        ):
+            last_modified = getattr(request, 'last_modified', None)
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(
+                    get_timestamp(last_modified)
+                )
+            cache.set(
+                key, (response, dict(request.cache_tags)), PAGE_CACHE_TIMEOUT
+            )
+        return response
+    return wrapper
+
+
+def conditional_page(view):
+    """Отвечает 304 Not Modified на условные GET-запросы.
+
+    ETag строится по версиям тегов, отмеченных view, Last-Modified -
+    по датам из add_last_modified. Оба запоминаются в кэше для пути
+    и пользователя, поэтому, пока версии тегов не изменились, ответ 304
+    отдается без вызова view. Без записи в кэше заголовки строятся
+    заново, в том числе для ответа из кэша страниц. Страницы
+    авторизованного пользователя содержат формы с CSRF-токеном, который
+    меняется при входе, поэтому их ETag зависит и от токена. Декоратор
+    ставится над cache_anonymous_page."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        page = f'{request.user.pk}:{request.get_full_path()}'
+        if request.user.is_authenticated:
+            page = f'{request.META.get("CSRF_COOKIE", "")}:{page}'
+        key = ETAG_KEY.format(md5(page.encode()).hexdigest())
+        request.cache_tags = TagVersions()
+        entry = cache.get(key)
+        if entry is not None:
+            etag, last_modified, versions = entry
+            if is_current(versions):
+                response = get_conditional_response(
+                    request, etag=etag,
+                    last_modified=get_timestamp(last_modified)
+                )
+                if response is not None:
+                    response['ETag'] = etag
+                    return response
+                add_last_modified(request, last_modified)
+            else:
+                request.cache_tags.prefetch(versions)
+        response = view(request, *args, **kwargs)
+        versions = request.cache_tags
+        if (
+            response.status_code != 200
+            or not versions
+            or not is_current(versions)
+            or not is_settled(versions)
+        ):
+            return response
+        etag = quote_etag(md5(
+            f'{page}:{sorted(versions.items())}'.encode()
+        ).hexdigest())
+        response['ETag'] = etag
+        last_modified = getattr(request, 'last_modified', None)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(
+                get_timestamp(last_modified)
+            )
+        cache.set(
+            key, (etag, last_modified, dict(versions)), PAGE_CACHE_TIMEOUT
+        )
+        return get_conditional_response(
+            request, etag=etag, last_modified=get_timestamp(last_modified),
+            response=response
+        )
+    return wrapper
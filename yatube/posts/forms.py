@@ -1,6 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import get_normalized_name, normalize_upload
 
 
 class PostForm(forms.ModelForm):
@@ -10,6 +13,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['text', 'group', 'image']
 
+    def clean_image(self):
+        """Небольшая картинка перекодируется сразу, большая сохраняется
+        под именем после перекодирования и обрабатывается воркером."""
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        width, height = image.image.size
+        if width * height <= settings.POST_IMAGE_INLINE_PIXELS:
+            return normalize_upload(image)
+        image.name = get_normalized_name(image.name)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """Форма комментария к посту."""
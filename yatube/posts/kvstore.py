@@ -0,0 +1,38 @@
+from django.core.cache import caches
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+
+class KVStore(KVStoreBase):
+    """Хранилище sorl только в кэше, без таблицы в БД.
+
+    После потери кэша миниатюры заново регистрирует команда
+    generate_thumbnails. Поиск ключей по префиксу кэш не поддерживает,
+    поэтому команды очистки sorl с этим хранилищем ничего не удаляют."""
+
+    @property
+    def cache(self):
+        return caches[settings.THUMBNAIL_CACHE]
+
+    def get_many(self, image_files):
+        """Находит несколько картинок одним запросом к кэшу.
+        Возвращает словарь {ключ картинки: ImageFile}."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        return {
+            keys[raw_key]: deserialize_image_file(value)
+            for raw_key, value in self.cache.get_many(list(keys)).items()
+        }
+
+    def _get_raw(self, key):
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        return []
@@ -0,0 +1,225 @@
+"""Живая лента: рассылка новых записей через Server-Sent Events.
+
+После фиксации новой записи сигнал публикует событие в хаб, а открытые
+потоки /live/ и /follow/live/ передают его клиентам. Хаб выбирается
+настройкой LIVE_FEED_HUB: LocalHub рассылает события внутри процесса,
+CacheHub - через общий кэш между процессами. Проект работает по WSGI,
+поэтому каждый поток занимает поток сервера и закрывается через
+LIVE_FEED_MAX_DURATION секунд, после чего браузер переподключается
+и по Last-Event-ID получает пропущенные записи. Потоки открываются
+только авторизованным пользователям, и одновременно их в процессе не
+больше LIVE_FEED_MAX_STREAMS, чтобы остальные потоки сервера отвечали
+на обычные запросы. Сверх лимита клиент получает 503 и пробует снова
+через LIVE_FEED_BUSY_RETRY секунд.
+
+Идентификатор события - токен ключа (pub_date, pk) записи: ключи разных
+шардов начинаются с разных диапазонов, поэтому по одному pk нельзя
+понять, какие записи других шардов клиент пропустил."""
+import json
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .sharding import sharded
+from .utils import decode_cursor, encode_cursor
+
+LIVE_FEED_KEEPALIVE = 15
+LIVE_FEED_MAX_DURATION = 5 * 60
+LIVE_FEED_QUEUE_SIZE = 100
+LIVE_FEED_RETRY = 5000
+LIVE_FEED_MAX_STREAMS = 4
+LIVE_FEED_BUSY_RETRY = 30
+CACHE_HUB_KEY = 'live:{}'
+CACHE_HUB_SEQUENCE_KEY = 'live:sequence'
+CACHE_HUB_TIMEOUT = 60
+CACHE_HUB_POLL_INTERVAL = 1
+
+
+def get_post_event(post):
+    return {
+        'id': post.pk, 'author': post.author_id, 'cursor': encode_cursor(post)
+    }
+
+
+class LocalHub:
+    """Хаб внутри процесса: у каждого подписчика своя очередь."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        subscriber = queue.Queue(LIVE_FEED_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        """Рассылает событие. Медленный подписчик, очередь которого
+        переполнена, событие пропускает."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def get(self, subscriber, timeout):
+        """Следующее событие подписчика или None по истечении timeout."""
+        try:
+            return subscriber.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class CacheHub:
+    """Хаб через общий кэш: события нумеруются счетчиком в кэше,
+    подписчики опрашивают его раз в CACHE_HUB_POLL_INTERVAL секунд.
+    Подходит для нескольких процессов с общим кэшем, например Redis."""
+
+    def subscribe(self):
+        cache.add(CACHE_HUB_SEQUENCE_KEY, 0, None)
+        return {'position': cache.get(CACHE_HUB_SEQUENCE_KEY, 0)}
+
+    def unsubscribe(self, subscriber):
+        pass
+
+    def publish(self, event):
+        cache.add(CACHE_HUB_SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(CACHE_HUB_SEQUENCE_KEY)
+        cache.set(CACHE_HUB_KEY.format(sequence), event, CACHE_HUB_TIMEOUT)
+
+    def get(self, subscriber, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            sequence = cache.get(CACHE_HUB_SEQUENCE_KEY, 0)
+            if subscriber['position'] < sequence:
+                subscriber['position'] += 1
+                event = cache.get(CACHE_HUB_KEY.format(subscriber['position']))
+                if event is not None:
+                    return event
+                continue
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(CACHE_HUB_POLL_INTERVAL)
+
+
+hub = SimpleLazyObject(lambda: import_string(settings.LIVE_FEED_HUB)())
+
+
+_streams_lock = threading.Lock()
+_streams = 0
+
+
+def acquire_stream():
+    """Занимает место для потока, если лимит процесса не исчерпан."""
+    global _streams
+    with _streams_lock:
+        if _streams >= LIVE_FEED_MAX_STREAMS:
+            return False
+        _streams += 1
+        return True
+
+
+def release_stream():
+    global _streams
+    with _streams_lock:
+        _streams -= 1
+
+
+class LiveStream:
+    """Поток событий, который освобождает место при закрытии ответа,
+    даже если клиент отключился до начала передачи."""
+
+    def __init__(self, events):
+        self.events = events
+        self.released = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        if not self.released:
+            self.released = True
+            release_stream()
+
+
+def format_event(event):
+    return (
+        f'id: {event["cursor"]}\nevent: post\n'
+        f'data: {json.dumps(event)}\n\n'
+    )
+
+
+def get_missed_events(last_event_id, author_ids=None):
+    """События о записях, появившихся после Last-Event-ID."""
+    cursor = decode_cursor(last_event_id) if last_event_id else None
+    if cursor is None:
+        return []
+    pub_date, pk = cursor
+    posts = sharded(Post.objects.filter(
+        Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+    ))
+    if author_ids is not None:
+        posts = posts.filter(author_id__in=author_ids)
+    posts = posts.order_by('pub_date', 'pk').only(
+        'author', 'pub_date'
+    )[:LIVE_FEED_QUEUE_SIZE]
+    return [get_post_event(post) for post in posts]
+
+
+def event_stream(missed_events=(), author_ids=None):
+    """Поток событий о новых записях, при author_ids - только
+    записей этих авторов. Пока событий нет, отправляет комментарий,
+    чтобы прокси не закрыли соединение."""
+    started = time.monotonic()
+    subscriber = hub.subscribe()
+    try:
+        yield f'retry: {LIVE_FEED_RETRY}\n\n'
+        for event in missed_events:
+            yield format_event(event)
+        while time.monotonic() - started < LIVE_FEED_MAX_DURATION:
+            event = hub.get(subscriber, LIVE_FEED_KEEPALIVE)
+            if event is None:
+                yield ': keepalive\n\n'
+            elif author_ids is None or event['author'] in author_ids:
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def stream_response(request, author_ids=None):
+    """Ответ с потоком событий, начиная с пропущенных клиентом.
+    Если потоков уже LIVE_FEED_MAX_STREAMS, отвечает 503."""
+    if not acquire_stream():
+        response = HttpResponse(status=503)
+        response['Retry-After'] = LIVE_FEED_BUSY_RETRY
+        return response
+    try:
+        missed_events = get_missed_events(
+            request.META.get('HTTP_LAST_EVENT_ID'), author_ids
+        )
+    except Exception:
+        release_stream()
+        raise
+    response = StreamingHttpResponse(
+        LiveStream(event_stream(missed_events, author_ids)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
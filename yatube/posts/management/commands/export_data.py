@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import (BATCH_SIZE, FORMATS, KINDS, NDJSON, export_rows,
+                        write_rows)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, сообщества, записи, комментарии '
+        'или подписки в NDJSON или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument(
+            '--format', choices=FORMATS, default=NDJSON, dest='file_format'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--output', help='Файл для выгрузки, по умолчанию stdout.'
+        )
+
+    def handle(self, *args, kind, file_format, batch_size, output,
+               **options):
+        rows = export_rows(kind, batch_size)
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = write_rows(rows, stream, file_format, kind)
+        else:
+            count = write_rows(rows, self.stdout, file_format, kind)
+        if options['verbosity']:
+            self.stderr.write(f'Выгружено строк: {count}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.sharding import get_post_databases
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры для картинок всех записей.'
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in get_post_databases():
+            images = Post.objects.using(alias).exclude(image='').exclude(
+                image=None
+            ).values_list('pk', 'image')
+            for post_id, name in images.iterator():
+                generate_thumbnails(name, post_ids=[post_id])
+                total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {total}'
+        ))
@@ -0,0 +1,82 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.bulk import (BATCH_SIZE, CSV, FORMATS, KINDS, NDJSON, import_rows,
+                        read_rows)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, сообщества, записи, комментарии '
+        'или подписки из NDJSON или CSV. С --checkpoint прерванную '
+        'загрузку можно продолжить с последней сохраненной пачки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, dest='file_format')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл, в котором хранится число загруженных строк.'
+        )
+
+    def handle(self, *args, kind, path, file_format, batch_size, checkpoint,
+               **options):
+        if file_format is None:
+            file_format = CSV if path.endswith('.csv') else NDJSON
+        skip = self.read_checkpoint(checkpoint)
+        started = time.monotonic()
+        orphans = invalid_rows = 0
+
+        def on_batch(position, skipped, invalid):
+            nonlocal orphans, invalid_rows
+            orphans, invalid_rows = skipped, invalid
+            if checkpoint:
+                self.write_checkpoint(checkpoint, position)
+            if options['verbosity']:
+                rate = (position - skip) / (time.monotonic() - started)
+                self.stderr.write(
+                    f'{kind}: обработано строк {position} ({rate:.0f} в с), '
+                    f'пропущено без записи {skipped}, '
+                    f'некорректных {invalid}'
+                )
+
+        with open(path, encoding='utf-8', newline='') as stream:
+            total = import_rows(
+                kind, read_rows(stream, file_format),
+                from_csv=file_format == CSV, batch_size=batch_size,
+                skip=skip, on_batch=on_batch
+            )
+        if invalid_rows:
+            self.stderr.write(self.style.WARNING(
+                f'Пропущено строк с пустыми обязательными полями '
+                f'или неверными значениями: {invalid_rows}.'
+            ))
+        if orphans:
+            self.stderr.write(self.style.WARNING(
+                f'Пропущено комментариев к записям, которых нет '
+                f'ни на одном шарде: {orphans}.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена, обработано строк: {total}, '
+            f'из них пропущено: {orphans + invalid_rows}. '
+            'Пересчитайте счетчики и поисковый индекс командами '
+            'rebuild_post_counters и rebuild_search_index.'
+        ))
+
+    def read_checkpoint(self, checkpoint):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as stream:
+            return int(stream.read().strip() or 0)
+
+    def write_checkpoint(self, checkpoint, position):
+        # Файл заменяется целиком, чтобы прерывание не оставило его пустым.
+        temporary = f'{checkpoint}.tmp'
+        with open(temporary, 'w') as stream:
+            stream.write(str(position))
+        os.replace(temporary, checkpoint)
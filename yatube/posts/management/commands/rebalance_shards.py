@@ -0,0 +1,74 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.bulk import insert_objects
+from posts.models import Comment, Group, Post, User
+from posts.sharding import get_shard, get_shards, init_sequences
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит шарды из POST_SHARDS и переносит записи с комментариями '
+        'на шарды их авторов.'
+    )
+
+    def handle(self, *args, **options):
+        shards = get_shards()
+        if not shards:
+            raise CommandError('Шарды не настроены: POST_SHARDS пуст.')
+        for alias in shards:
+            init_sequences(alias)
+            self.copy_references(alias)
+        moved = 0
+        for source in ['default'] + shards:
+            author_ids = Post.objects.using(source).order_by().values_list(
+                'author', flat=True
+            ).distinct()
+            for author_id in list(author_ids):
+                target = get_shard(author_id)
+                if target != source:
+                    moved += self.move_posts(author_id, source, target)
+        call_command('rebuild_post_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено записей: {moved}'
+        ))
+
+    def copy_references(self, alias):
+        """Добавляет на шард недостающих пользователей и сообщества."""
+        for model in (User, Group):
+            existing = set(
+                model.objects.using(alias).values_list('pk', flat=True)
+            )
+            model.objects.using(alias).bulk_create(
+                (
+                    obj for obj in model.objects.using('default')
+                    if obj.pk not in existing
+                ),
+                batch_size=BATCH_SIZE
+            )
+
+    def move_posts(self, author_id, source, target):
+        """Переносит записи автора пачками: сначала копирует их на новый
+        шард, затем удаляет со старого. Прерванный перенос можно
+        повторить - уже скопированные строки пропускаются."""
+        moved = 0
+        posts = Post.objects.using(source).filter(author_id=author_id)
+        while True:
+            batch = list(posts.order_by('pk')[:BATCH_SIZE])
+            if not batch:
+                return moved
+            pks = [post.pk for post in batch]
+            comments = list(
+                Comment.objects.using(source).filter(post__in=pks)
+            )
+            # bulk_create заменил бы даты текущим временем (auto_now_add).
+            with transaction.atomic(using=target):
+                insert_objects(Post, batch, target)
+                insert_objects(Comment, comments, target)
+            with transaction.atomic(using=source):
+                Post.objects.using(source).filter(pk__in=pks).delete()
+            moved += len(batch)
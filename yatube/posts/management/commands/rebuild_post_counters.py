@@ -0,0 +1,37 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Post, PostCounter
+from posts.sharding import get_post_databases
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики записей авторов и сообществ.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        authors, groups = Counter(), Counter()
+        for alias in get_post_databases():
+            posts = Post.objects.using(alias).order_by()
+            for row in posts.values('author').annotate(total=Count('pk')):
+                authors[row['author']] += row['total']
+            for row in posts.exclude(group=None).values('group').annotate(
+                total=Count('pk')
+            ):
+                groups[row['group']] += row['total']
+        PostCounter.objects.all().delete()
+        counters = [
+            PostCounter(author_id=author_id, posts_count=total)
+            for author_id, total in authors.items()
+        ]
+        counters += [
+            PostCounter(group_id=group_id, posts_count=total)
+            for group_id, total in groups.items()
+        ]
+        PostCounter.objects.bulk_create(counters)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано счетчиков: {len(counters)}'
+        ))
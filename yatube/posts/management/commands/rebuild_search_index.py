@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import rebuild_index
+from posts.sharding import get_post_databases
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс записей.'
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in get_post_databases():
+            with transaction.atomic(using=alias):
+                total += rebuild_index(alias)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано записей: {total}'
+        ))
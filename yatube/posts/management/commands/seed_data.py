@@ -0,0 +1,177 @@
+import random
+import time
+from argparse import ArgumentTypeError
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from faker import Faker
+
+from posts.bulk import import_rows
+from posts.models import Group, Post, User
+from posts.sharding import get_post_databases
+
+ZIPF_EXPONENT = 1.1
+SEED_PERIOD = timedelta(days=365)
+# Даты отсчитываются от фиксированного момента, а не от текущего,
+# чтобы при одинаковом --seed данные совпадали в любой день.
+SEED_NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SEED_PASSWORD = 'benchmark'
+
+
+def parse_now(value):
+    date = parse_datetime(value)
+    if date is None:
+        raise ArgumentTypeError(f'Неверная дата: {value}.')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def get_cum_weights(count):
+    """Накопленные веса закона Ципфа: объект с рангом r выбирается
+    с вероятностью, пропорциональной 1 / r ** ZIPF_EXPONENT."""
+    return list(accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)
+    ))
+
+
+class PowerLawChoice:
+    """Случайный выбор из values, при котором немногие популярные
+    значения встречаются часто, а большинство - редко."""
+
+    def __init__(self, rng, values):
+        self.rng = rng
+        self.values = list(values)
+        rng.shuffle(self.values)
+        self.cum_weights = get_cum_weights(len(self.values))
+
+    def __call__(self):
+        return self.rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет БД случайными пользователями, сообществами, подписками, '
+        'записями и комментариями для нагрузочных тестов. Подписки и '
+        'комментарии распределены по степенному закону. При одинаковых '
+        '--seed и --now на пустой БД данные совпадают.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--follows', type=int, default=500000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--now', type=parse_now, default=SEED_NOW,
+            help='Самая поздняя дата записей, например 2024-01-01T00:00.'
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.now = options['now']
+        self.load('users', self.generate_users(options['users']))
+        self.load('groups', self.generate_groups(options['groups']))
+        user_ids = list(User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        group_ids = list(Group.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        authors = PowerLawChoice(self.rng, user_ids)
+        self.load('follows', self.generate_follows(
+            options['follows'], user_ids, authors
+        ))
+        self.load('posts', self.generate_posts(
+            options['posts'], authors, group_ids
+        ))
+        post_ids = [
+            pk for alias in get_post_databases()
+            for pk in Post.objects.using(alias).order_by('pk').values_list(
+                'pk', flat=True
+            ).iterator()
+        ]
+        self.load('comments', self.generate_comments(
+            options['comments'], PowerLawChoice(self.rng, post_ids), authors
+        ))
+        call_command('rebuild_post_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+
+    def load(self, kind, rows):
+        started = time.monotonic()
+
+        def on_batch(position, skipped, invalid):
+            if self.verbosity:
+                rate = position / (time.monotonic() - started)
+                self.stderr.write(
+                    f'{kind}: создано строк {position} ({rate:.0f} в с), '
+                    f'пропущено {skipped + invalid}'
+                )
+
+        total = import_rows(kind, rows, on_batch=on_batch)
+        self.stdout.write(f'{kind}: {total}')
+
+    def random_date(self):
+        return self.now - self.rng.random() * SEED_PERIOD
+
+    def generate_users(self, count):
+        # Хеш пароля считается один раз: это самая медленная часть.
+        password = make_password(SEED_PASSWORD)
+        for number in range(count):
+            yield {
+                'username': f'{self.fake.user_name()}_{number}',
+                'first_name': self.fake.first_name(),
+                'last_name': self.fake.last_name(),
+                'email': self.fake.email(),
+                'password': password,
+                'is_active': True,
+                'is_staff': False,
+                'is_superuser': False,
+                'date_joined': self.random_date(),
+            }
+
+    def generate_groups(self, count):
+        for number in range(count):
+            yield {
+                'title': f'{self.fake.word().capitalize()} {number}',
+                'slug': f'group-{number}',
+                'description': self.fake.paragraph(),
+            }
+
+    def generate_follows(self, count, user_ids, authors):
+        for _ in range(count):
+            user, author = self.rng.choice(user_ids), authors()
+            if user != author:
+                yield {'user': user, 'author': author}
+
+    def generate_posts(self, count, authors, group_ids):
+        for _ in range(count):
+            group = self.rng.choice(group_ids) if group_ids else None
+            yield {
+                'text': self.fake.paragraph(
+                    nb_sentences=self.rng.randint(1, 10)
+                ),
+                'pub_date': self.random_date(),
+                'author': authors(),
+                'group': group if self.rng.random() < 0.5 else None,
+                'image': '',
+            }
+
+    def generate_comments(self, count, posts, authors):
+        for _ in range(count):
+            yield {
+                'post': posts(),
+                'author': authors(),
+                'text': self.fake.sentence(),
+                'created': self.random_date(),
+            }
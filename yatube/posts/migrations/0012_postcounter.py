@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_auto_20221019_1457'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Число записей')),
+                ('author', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='post_counter', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('group', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='post_counter', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Счетчик записей',
+                'verbose_name_plural': 'Счетчики записей',
+            },
+        ),
+    ]
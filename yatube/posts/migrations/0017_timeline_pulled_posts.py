@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+FANOUT_FOLLOWERS_LIMIT = 1000
+
+
+def mark_pulled_posts(apps, schema_editor):
+    """Записи популярных авторов раньше не раскладывались по лентам.
+    Строки ленты, которые 0013 успела создать для этих записей, удаляются:
+    подмешанная запись иначе выводилась бы в ленте дважды."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    pull_author_ids = Follow.objects.order_by().values('author').annotate(
+        followers=Count('pk')
+    ).filter(
+        followers__gt=FANOUT_FOLLOWERS_LIMIT
+    ).values_list('author', flat=True)
+    Post.objects.filter(author__in=list(pull_author_ids)).update(pulled=True)
+    TimelineEntry.objects.filter(post__pulled=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_date_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='pulled',
+            field=models.BooleanField(default=False, help_text='Запись не разложена по лентам подписчиков и подмешивается в них при чтении', verbose_name='Читается без раскладки'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pulled', '-pub_date'], name='post_author_pulled_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_date_post_idx'),
+        ),
+        migrations.RunPython(mark_pulled_posts, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,58 @@
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (F, Func, OuterRef, Prefetch, Subquery,
+                              UniqueConstraint)
+
+from .sharding import sharded
 
 User = get_user_model()
 
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+)
+LATEST_COMMENTS = 3
+
+
+class ShardedQuerySet(models.QuerySet):
+    """Выборка моделей, которые могут храниться на шардах."""
+
+    def create(self, **kwargs):
+        """Создает объект. Без явного using БД выбирает роутер
+        по самому объекту, например по автору записи."""
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
+class PostQuerySet(ShardedQuerySet):
+    """Выборки записей для лент."""
+
+    def feed(self):
+        """Записи для ленты вместе с авторами, сообществами, числом
+        комментариев и LATEST_COMMENTS последними комментариями.
+        Загружаются только поля, которые выводит шаблон ленты."""
+        return self.select_related('author', 'group').only(
+            *FEED_FIELDS
+        ).annotate(
+            comments_count=Subquery(
+                Comment.objects.filter(post=OuterRef('pk')).order_by()
+                .annotate(count=Func(F('pk'), function='COUNT'))
+                .values('count'),
+                output_field=models.IntegerField()
+            )
+        ).prefetch_related(Prefetch(
+            'comments',
+            queryset=Comment.objects.latest_per_post(LATEST_COMMENTS),
+            to_attr='latest_comments'
+        ))
+
 
 class Post(models.Model):
     """Класс описывающий модель записи."""
@@ -36,11 +85,25 @@ class Post(models.Model):
         null=True,
         verbose_name='Картинка'
     )
+    pulled = models.BooleanField(
+        default=False,
+        verbose_name='Читается без раскладки',
+        help_text='Запись не разложена по лентам подписчиков '
+                  'и подмешивается в них при чтении'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', 'pulled', '-pub_date'],
+                name='post_author_pulled_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -62,6 +125,21 @@ class Group(models.Model):
         return self.title
 
 
+class CommentQuerySet(ShardedQuerySet):
+
+    def latest_per_post(self, number):
+        """Последние number комментариев каждой записи вместе с авторами.
+        Для всех записей страницы выбираются одним запросом."""
+        latest = Comment.objects.filter(
+            post=OuterRef('post')
+        ).order_by('-created', '-pk').values('pk')[:number]
+        return self.filter(pk__in=Subquery(latest)).select_related(
+            'author'
+        ).only('post', 'text', 'created', 'author__username').order_by(
+            '-created', '-pk'
+        )
+
+
 class Comment(models.Model):
     """Класс комментариев к постам."""
 
@@ -82,9 +160,16 @@ class Comment(models.Model):
         auto_now_add=True, verbose_name='Дата комментария'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -104,4 +189,98 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
-        UniqueConstraint(fields=['user', 'author'], name='unique_follow')
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class PostCounterManager(models.Manager):
+    """Чтение и изменение счетчиков записей."""
+
+    def add(self, delta, **target):
+        """Изменяет счетчик автора или сообщества на delta.
+        Отсутствующий счетчик будет посчитан при первом чтении."""
+        self.filter(**target).update(posts_count=F('posts_count') + delta)
+
+    def get_count(self, **target):
+        """Возвращает число записей автора или сообщества."""
+        posts_count = self.filter(**target).values_list(
+            'posts_count', flat=True
+        ).first()
+        if posts_count is None:
+            counter, _ = self.get_or_create(
+                defaults={'posts_count': sharded(Post.objects.filter(
+                    **target
+                )).count()},
+                **target
+            )
+            posts_count = counter.posts_count
+        return posts_count
+
+
+class PostCounter(models.Model):
+    """Денормализованное число записей автора или сообщества."""
+
+    author = models.OneToOneField(
+        User,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='post_counter',
+        verbose_name='Автор'
+    )
+    group = models.OneToOneField(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='post_counter',
+        verbose_name='Группа'
+    )
+    posts_count = models.IntegerField(
+        default=0, verbose_name='Число записей'
+    )
+
+    objects = PostCounterManager()
+
+    class Meta:
+        verbose_name = 'Счетчик записей'
+        verbose_name_plural = 'Счетчики записей'
+
+
+class TimelineEntry(models.Model):
+    """Запись в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Запись'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_post_idx'
+            ),
+        ]
@@ -0,0 +1,87 @@
+"""Полнотекстовый поиск по тексту записей.
+
+В SQLite текст записей дублируется в таблицу FTS5 SEARCH_TABLE,
+которую сигналы обновляют при сохранении и удалении записи.
+Результаты упорядочиваются по релевантности (bm25).
+На других СУБД поиск сводится к фильтру icontains.
+
+С шардами у каждого шарда свой индекс FTS5. bm25 считает частоту слов
+и среднюю длину текста по своему шарду, поэтому оценки разных шардов
+несравнимы, и порядок объединенной MergedFeed выдачи приблизительный:
+внутри шарда он точный, а между шардами записи чередуются по оценкам
+своих индексов. Набор найденных записей от этого не зависит."""
+import re
+
+from django.db import connection, connections
+
+SEARCH_TABLE = 'posts_post_fts'
+SEARCH_WORD = re.compile(r'\w+')
+NUMBER_SEARCH_WORDS = 10
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    """Запрос MATCH из слов строки поиска: записи, содержащие все слова.
+    Слова ищутся как префиксы, чтобы находить разные окончания."""
+    words = SEARCH_WORD.findall(query)[:NUMBER_SEARCH_WORDS]
+    if not words:
+        return ''
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_posts(posts, query):
+    """Отбирает из выборки записи, найденные по строке поиска,
+    от более релевантных к менее релевантным. Для выборки из нескольких
+    шардов порядок приблизительный, см. описание модуля."""
+    if not is_supported():
+        return posts.filter(text__icontains=query.strip())
+    match = build_match_query(query)
+    if not match:
+        return posts.none()
+    return posts.extra(
+        select={'rank': f'{SEARCH_TABLE}.rank'},
+        tables=[SEARCH_TABLE],
+        where=[
+            f'{SEARCH_TABLE}.rowid = posts_post.id',
+            f'{SEARCH_TABLE} MATCH %s',
+        ],
+        params=[match],
+    ).order_by('rank', '-pub_date')
+
+
+def index_post(post, using='default'):
+    """Добавляет запись в индекс или обновляет ее текст."""
+    if not is_supported():
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def unindex_post(pk, using='default'):
+    """Удаляет запись из индекса."""
+    if not is_supported():
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index(using='default'):
+    """Заново заполняет индекс текстами всех записей."""
+    if not is_supported():
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+        return cursor.rowcount
@@ -0,0 +1,295 @@
+"""Хранение записей и комментариев на нескольких БД (шардах) по автору.
+
+Шарды перечисляются в настройке POST_SHARDS. Записи автора хранятся на
+шарде get_shard(author_id), комментарии - на шарде своей записи, поэтому
+профиль и страница записи читают один шард. Пользователи и сообщества
+копируются на все шарды, чтобы выборки с select_related работали внутри
+шарда. Первичные ключи записей и комментариев на шарде с номером N
+начинаются с (N + 1) * SHARD_ID_RANGE и не пересекаются между шардами.
+Ленты из нескольких шардов объединяет MergedFeed.
+Без POST_SHARDS все данные остаются в основной БД."""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404
+
+SHARDED_MODELS = {'posts.Post', 'posts.Comment'}
+SHARDED_TABLES = ('posts_post', 'posts_comment')
+SHARD_ID_RANGE = 10 ** 12
+# Поля, которые на шардах не читаются: записи и комментарии выводят
+# только имя автора. Сохранение лишь этих полей, например обновление
+# last_login при входе, на шарды не копируется.
+SHARD_LOCAL_FIELDS = frozenset({'last_login', 'password'})
+
+
+def get_shards():
+    return settings.POST_SHARDS
+
+
+def is_sharded():
+    return bool(settings.POST_SHARDS)
+
+
+def get_post_databases():
+    """БД, в которых хранятся записи."""
+    return get_shards() or ['default']
+
+
+def get_shard(author_id):
+    """Шард, на котором хранятся записи автора."""
+    shards = get_shards()
+    return shards[author_id % len(shards)]
+
+
+def get_pk_shards(pk):
+    """Шарды в порядке вероятности найти на них объект с ключом pk:
+    сначала шард, выдавший ключ, затем остальные - на них объект мог
+    попасть при перебалансировке."""
+    shards = get_shards()
+    index = pk // SHARD_ID_RANGE - 1
+    if 0 <= index < len(shards):
+        return [shards[index]] + shards[:index] + shards[index + 1:]
+    return list(shards)
+
+
+def get_instance_db(instance):
+    """Шард записи или комментария. У нового объекта _state.db мог
+    остаться от присвоенного внешнего ключа, например автора, поэтому
+    шард определяется по автору записи."""
+    if instance._state.db and not instance._state.adding:
+        return instance._state.db
+    if instance._meta.label == 'posts.Post':
+        return get_shard(instance.author_id)
+    post_field = instance._meta.get_field('post')
+    if post_field.is_cached(instance):
+        return get_instance_db(instance.post)
+    for alias in get_pk_shards(instance.post_id):
+        if post_field.related_model._base_manager.using(alias).filter(
+            pk=instance.post_id
+        ).exists():
+            return alias
+    return None
+
+
+class ShardRouter:
+    """Направляет записи и комментарии на шард по подсказке instance.
+    Выборки без подсказки нужно явно направлять функциями этого модуля."""
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded() or model._meta.label not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._meta.label in SHARDED_MODELS:
+            return get_instance_db(instance)
+        if (
+            model._meta.label == 'posts.Post'
+            and instance._meta.label == settings.AUTH_USER_MODEL
+        ):
+            return get_shard(instance.pk)
+        return None
+
+    db_for_write = db_for_read
+
+
+class OrderingKey:
+    """Ключ сравнения объектов по полям ordering с учетом направления."""
+
+    __slots__ = ('values', 'descending')
+
+    def __init__(self, obj, ordering):
+        self.values = [getattr(obj, field.lstrip('-')) for field in ordering]
+        self.descending = [field.startswith('-') for field in ordering]
+
+    def __lt__(self, other):
+        for value, other_value, descending in zip(
+            self.values, other.values, self.descending
+        ):
+            if value != other_value:
+                if descending:
+                    return value > other_value
+                return value < other_value
+        return False
+
+
+class MergedFeed:
+    """Выборка из нескольких шардов, которую можно фильтровать,
+    сортировать, считать и срезать как QuerySet. Срез [a:b] берет
+    первые b объектов каждого шарда и сливает их по ordering."""
+
+    def __init__(self, querysets, ordering=None):
+        self.querysets = querysets
+        if ordering is None:
+            queryset = next(iter(querysets.values()))
+            ordering = (
+                queryset.query.order_by or queryset.model._meta.ordering
+            )
+        self.ordering = tuple(ordering)
+
+    def _chain(self, method, *args, **kwargs):
+        return type(self)({
+            alias: getattr(queryset, method)(*args, **kwargs)
+            for alias, queryset in self.querysets.items()
+        }, self.ordering)
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain('exclude', *args, **kwargs)
+
+    def extra(self, *args, **kwargs):
+        return self._chain('extra', *args, **kwargs)
+
+    def values(self, *fields):
+        return self._chain('values', *fields)
+
+    def only(self, *fields):
+        return self._chain('only', *fields)
+
+    def none(self):
+        return self._chain('none')
+
+    def order_by(self, *ordering):
+        feed = self._chain('order_by', *ordering)
+        feed.ordering = ordering
+        return feed
+
+    def using(self, alias):
+        """Выборка одного шарда."""
+        return self.querysets[alias]
+
+    @property
+    def ordered(self):
+        return bool(self.ordering)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets.values())
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets.values())
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            objects = self[key:key + 1]
+            if not objects:
+                raise IndexError('MergedFeed index out of range')
+            return objects[0]
+        start, stop = key.start or 0, key.stop
+        querysets = self.querysets.values()
+        if stop is not None:
+            querysets = [queryset[:stop] for queryset in querysets]
+        merged = heapq.merge(
+            *querysets, key=lambda obj: OrderingKey(obj, self.ordering)
+        )
+        return list(islice(merged, start, stop))
+
+
+def sharded(queryset):
+    """Выборка записей или комментариев со всех шардов."""
+    if not is_sharded():
+        return queryset
+    return MergedFeed({alias: queryset.using(alias) for alias in get_shards()})
+
+
+def for_author(queryset, author_id):
+    """Выборка с шарда автора."""
+    if not is_sharded():
+        return queryset
+    return queryset.using(get_shard(author_id))
+
+
+def for_authors(queryset, author_ids):
+    """Записи авторов author_ids только с их шардов."""
+    queryset = queryset.filter(author__in=author_ids)
+    if not is_sharded():
+        return queryset
+    shards = {get_shard(author_id) for author_id in author_ids}
+    if not shards:
+        return queryset.none()
+    return MergedFeed({
+        alias: queryset.using(alias)
+        for alias in get_shards() if alias in shards
+    })
+
+
+def get_post(queryset, pk):
+    """Запись по первичному ключу или None."""
+    if not is_sharded():
+        return queryset.filter(pk=pk).first()
+    for alias in get_pk_shards(pk):
+        post = queryset.using(alias).filter(pk=pk).first()
+        if post is not None:
+            return post
+    return None
+
+
+def get_post_or_404(queryset, pk):
+    post = get_post(queryset, pk)
+    if post is None:
+        raise Http404('Запись не найдена.')
+    return post
+
+
+def init_sequences(alias):
+    """Начинает ключи записей и комментариев шарда с его диапазона."""
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return
+    start = (get_shards().index(alias) + 1) * SHARD_ID_RANGE
+    with connection.cursor() as cursor:
+        for table in SHARDED_TABLES:
+            cursor.execute(
+                'SELECT seq FROM sqlite_sequence WHERE name = %s', [table]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, start]
+                )
+            elif row[0] < start:
+                cursor.execute(
+                    'UPDATE sqlite_sequence SET seq = %s WHERE name = %s',
+                    [start, table]
+                )
+
+
+def is_replicated(update_fields):
+    """Нужно ли копировать на шарды сохранение с update_fields."""
+    return not update_fields or not set(update_fields) <= SHARD_LOCAL_FIELDS
+
+
+def copy_to_shards(instance, update_fields=None):
+    """Копирует пользователя или сообщество на все шарды, с update_fields
+    обновляет только эти поля. Сигналы при этом не вызываются."""
+    model = type(instance)
+    fields = {
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields if not field.primary_key
+    }
+    changed = fields
+    if update_fields:
+        names = {
+            model._meta.get_field(name).attname for name in update_fields
+        }
+        changed = {
+            name: value for name, value in fields.items() if name in names
+        }
+    for alias in get_shards():
+        manager = model._base_manager.using(alias)
+        if not manager.filter(pk=instance.pk).update(**changed):
+            manager.bulk_create([model(pk=instance.pk, **fields)])
+
+
+def delete_from_shards(model, pk):
+    """Удаляет копии пользователя или сообщества со всех шардов
+    вместе с записями, которые от них зависят."""
+    for alias in get_shards():
+        model._base_manager.using(alias).filter(pk=pk).delete()
@@ -0,0 +1,199 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, live, search, sharding, timeline
+from .caching import (FEED_TAG, author_tag, follower_tag, get_instance_tags,
+                      group_tag, invalidate_tags, post_tag)
+from .models import Comment, Follow, Group, Post, PostCounter, User
+
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def mark_pulled_post(sender, instance, **kwargs):
+    """Решает, будет ли новая запись разложена по лентам подписчиков."""
+    if instance._state.adding:
+        timeline.set_pulled([instance])
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_owners(sender, instance, using, **kwargs):
+    """Запоминает автора и сообщество записи до изменения."""
+    instance._old_owners = None
+    if not instance._state.adding:
+        instance._old_owners = Post.objects.using(using).filter(
+            pk=instance.pk
+        ).values_list('author_id', 'group_id').first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    """Обновляет счетчики при создании записи и смене автора или группы.
+    Новую запись добавляет в ленты подписчиков."""
+    if created:
+        timeline.fan_out(instance)
+    old_author_id, old_group_id = getattr(
+        instance, '_old_owners', None
+    ) or (None, None)
+    if instance.author_id != old_author_id:
+        PostCounter.objects.add(1, author_id=instance.author_id)
+        if old_author_id:
+            PostCounter.objects.add(-1, author_id=old_author_id)
+    if instance.group_id != old_group_id:
+        if instance.group_id:
+            PostCounter.objects.add(1, group_id=instance.group_id)
+        if old_group_id:
+            PostCounter.objects.add(-1, group_id=old_group_id)
+
+
+@receiver(post_save, sender=Post)
+def publish_new_post(sender, instance, created, **kwargs):
+    """Отправляет новую запись в живую ленту после фиксации транзакции."""
+    if created:
+        event = live.get_post_event(instance)
+        transaction.on_commit(lambda: live.hub.publish(event))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    """Уменьшает счетчики автора и сообщества удаленной записи."""
+    PostCounter.objects.add(-1, author_id=instance.author_id)
+    if instance.group_id:
+        PostCounter.objects.add(-1, group_id=instance.group_id)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, using, **kwargs):
+    """Обновляет текст записи в поисковом индексе."""
+    search.index_post(instance, using)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, using, **kwargs):
+    """Убирает удаленную запись из поискового индекса."""
+    search.unindex_post(instance.pk, using)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Добавляет записи автора в ленту нового подписчика."""
+    if created:
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Убирает записи автора из ленты отписавшегося пользователя."""
+    timeline.prune(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    """Сбрасывает версию ленты подписок пользователя."""
+    invalidate_tags(follower_tag(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, created=True, **kwargs):
+    """Сбрасывает кэш страниц и фрагментов, на которых выводится запись."""
+    tags = get_instance_tags(instance)
+    old_owners = getattr(instance, '_old_owners', None)
+    if old_owners:
+        tags.add(author_tag(old_owners[0]))
+        if old_owners[1]:
+            tags.add(group_tag(old_owners[1]))
+    if created:
+        tags.add(FEED_TAG)
+    invalidate_tags(*tags)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    """Сбрасывает кэш страницы поста при изменении комментариев."""
+    invalidate_tags(post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    """Сбрасывает кэш страниц, зависящих от сообщества."""
+    invalidate_tags(group_tag(instance.pk))
+
+
+@receiver(pre_save, sender=User)
+def remember_author_name(sender, instance, using, update_fields=None,
+                         **kwargs):
+    """Запоминает имя пользователя до изменения. Сохранения, не
+    затрагивающие имя, например обновление last_login, его не читают."""
+    instance._old_name = None
+    if (
+        instance._state.adding
+        or using in sharding.get_shards()
+        or update_fields and not set(AUTHOR_NAME_FIELDS) & set(update_fields)
+    ):
+        return
+    instance._old_name = User.objects.using(using).filter(
+        pk=instance.pk
+    ).values_list(*AUTHOR_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, **kwargs):
+    """Сбрасывает кэш страниц и фрагментов, на которых выводится имя
+    автора."""
+    old_name = getattr(instance, '_old_name', None)
+    name = tuple(getattr(instance, field) for field in AUTHOR_NAME_FIELDS)
+    if old_name is not None and old_name != name:
+        invalidate_tags(author_tag(instance.pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=User)
+def copy_saved_reference(sender, instance, using, update_fields=None,
+                         **kwargs):
+    """Копирует сохраненное сообщество или пользователя на шарды."""
+    if (
+        using not in sharding.get_shards()
+        and sharding.is_replicated(update_fields)
+    ):
+        sharding.copy_to_shards(instance, update_fields)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def delete_reference_copies(sender, instance, using, **kwargs):
+    """Удаляет копии сообщества или пользователя с шардов."""
+    if using not in sharding.get_shards():
+        sharding.delete_from_shards(sender, instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def index_saved_group(sender, instance, **kwargs):
+    """Обновляет сообщество в индексе подсказок."""
+    autocomplete.index.update(autocomplete.GROUP, instance)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_deleted_group(sender, instance, **kwargs):
+    """Убирает удаленное сообщество из индекса подсказок."""
+    autocomplete.index.update(autocomplete.GROUP, instance, removed=True)
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, update_fields=None, **kwargs):
+    """Обновляет пользователя в индексе подсказок.
+    Сохранения, не затрагивающие имя и активность, например обновление
+    last_login при входе, индекс не меняют."""
+    if update_fields and not {'username', 'is_active'} & set(update_fields):
+        return
+    autocomplete.index.update(autocomplete.USER, instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    """Убирает удаленного пользователя из индекса подсказок."""
+    autocomplete.index.update(autocomplete.USER, instance, removed=True)
@@ -0,0 +1,16 @@
+from django import template
+
+from ..thumbnails import lookup_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(image, geometry):
+    """URL готовой миниатюры или исходной картинки, пока миниатюры нет."""
+    if not image:
+        return ''
+    thumbnail = lookup_thumbnail(image, geometry)
+    if thumbnail:
+        return thumbnail.url
+    return image.url
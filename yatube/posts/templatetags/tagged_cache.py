@@ -0,0 +1,87 @@
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from ..caching import (TagVersions, get_instance_tags, is_current,
+                       is_settled)
+
+register = template.Library()
+
+DEPENDENCIES = '_cache_dependencies'
+
+
+class TaggedCacheNode(template.Node):
+    """Фрагмент, который сбрасывается при изменении выведенных в нем
+    записей, авторов и сообществ."""
+
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time_var = expire_time_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time_var.resolve(context))
+        except (template.VariableDoesNotExist, TypeError, ValueError):
+            raise template.TemplateSyntaxError(
+                f'"tagged_cache" tag got a non-integer timeout value: '
+                f'{self.expire_time_var.var!r}'
+            )
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on]
+        )
+        outer = context.get(DEPENDENCIES)
+        entry = cache.get(key)
+        if entry is not None:
+            value, versions = entry
+            if is_current(versions):
+                if outer is not None:
+                    outer.add(versions)
+                return value
+        dependencies = TagVersions()
+        if entry is not None:
+            dependencies.prefetch(versions)
+        with context.push({DEPENDENCIES: dependencies}):
+            value = self.nodelist.render(context)
+        if is_current(dependencies) and is_settled(dependencies):
+            cache.set(key, (value, dict(dependencies)), expire_time)
+        if outer is not None:
+            outer.add(dependencies)
+        return value
+
+
+@register.tag('tagged_cache')
+def do_tagged_cache(parser, token):
+    """Кэширует фрагмент так же, как {% cache %}, и запоминает, какие
+    записи, авторы и сообщества в нем выведены.
+
+        {% tagged_cache [expire_time] [fragment_name] [var1] [var2] .. %}
+            {% cache_depends post %}
+        {% endtagged_cache %}
+    """
+    nodelist = parser.parse(('endtagged_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments."
+        )
+    return TaggedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]]
+    )
+
+
+@register.simple_tag(takes_context=True)
+def cache_depends(context, *objects):
+    """Добавляет записи, авторов, сообщества или готовые теги
+    в зависимости ближайшего {% tagged_cache %}."""
+    dependencies = context.get(DEPENDENCIES)
+    if dependencies is not None:
+        for obj in objects:
+            dependencies.track(get_instance_tags(obj))
+    return ''
@@ -0,0 +1,137 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from ..utils import NUMBER_POSTS
+
+
+class ApiTests(TestCase):
+    """Тестирует JSON API лент."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.reader = User.objects.create(
+            username='reader'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovaya-gruppa',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Запись {i}', author=cls.user, group=cls.group)
+            for i in range(NUMBER_POSTS + 1)
+        )
+        cls.post = Post.objects.latest('pk')
+        cls.comment = Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='Комментарий к посту'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feeds(self):
+        """Ленты отдают записи страницами по токену after."""
+        urls = {
+            reverse('api_v1:posts_list'): self.client,
+            reverse(
+                'api_v1:group_list', kwargs={'slug': self.group.slug}
+            ): self.client,
+            reverse(
+                'api_v1:profile', kwargs={'username': self.user.username}
+            ): self.client,
+            reverse('api_v1:follow_index'): self.authorized_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                data = client.get(url).json()
+                self.assertEqual(len(data['results']), NUMBER_POSTS)
+                first = data['results'][0]
+                self.assertEqual(first['text'], self.post.text)
+                self.assertEqual(first['author'], self.user.username)
+                self.assertEqual(first['group'], self.group.slug)
+                self.assertEqual(first['comments_count'], 1)
+                self.assertEqual(
+                    first['latest_comments'][0]['text'], self.comment.text
+                )
+                data = client.get(data['next']).json()
+                self.assertEqual(len(data['results']), 1)
+                self.assertIsNone(data['next'])
+
+    def test_post_detail(self):
+        """Запись отдается вместе с комментариями."""
+        data = self.client.get(reverse(
+            'api_v1:post_detail', kwargs={'post_id': self.post.pk}
+        )).json()
+        self.assertEqual(data['post']['id'], self.post.pk)
+        self.assertEqual(data['comments'][0]['author'], 'reader')
+
+    def test_errors(self):
+        """Ошибки возвращаются в JSON."""
+        response = self.client.get(
+            reverse('api_v1:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+        response = self.client.get(reverse('api_v1:follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без запросов к БД."""
+        url = reverse('api_v1:posts_list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_since(self):
+        """Last-Modified берется из даты последнего комментария."""
+        url = reverse('api_v1:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertEqual(
+            response['Last-Modified'],
+            self.comment.created.strftime('%a, %d %b %Y %H:%M:%S GMT')
+        )
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes(self):
+        """ETag меняется после нового комментария или правки записи."""
+        url = reverse('api_v1:posts_list')
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Еще')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленная запись'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'][0]['text'], 'Исправленная запись'
+        )
+
+    def test_follow_etag_changes_on_follow(self):
+        """ETag ленты подписок меняется при отписке."""
+        url = reverse('api_v1:follow_index')
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..autocomplete import USER, PrefixIndex, index
+from ..models import Group, User
+
+
+class AutocompleteTests(TestCase):
+    """Тестирует подсказки сообществ и авторов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.group = Group.objects.create(
+            title='Любители котов',
+            slug='cats',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_labels(self, query):
+        response = self.client.get(reverse('posts:autocomplete'), {'q': query})
+        return [result['label'] for result in response.json()['results']]
+
+    def test_prefix_matches(self):
+        """Подсказки находятся по началу slug, названия и имени."""
+        self.assertEqual(self.get_labels('ca'), ['Любители котов'])
+        self.assertEqual(self.get_labels('ЛЮБ'), ['Любители котов'])
+        self.assertEqual(self.get_labels('el'), ['Elena'])
+        self.assertEqual(self.get_labels('x'), [])
+        self.assertEqual(self.get_labels(''), [])
+
+    def test_result_urls(self):
+        """Подсказка ведет на страницу сообщества или профиля."""
+        response = self.client.get(reverse('posts:autocomplete'), {'q': 'c'})
+        self.assertEqual(response.json()['results'], [{
+            'type': 'group',
+            'label': 'Любители котов',
+            'url': reverse('posts:group_list', kwargs={'slug': 'cats'}),
+        }])
+
+    def test_lookup_without_queries(self):
+        """Построенный индекс отвечает без запросов к БД."""
+        index.search('a')
+        with self.assertNumQueries(0):
+            self.assertEqual(index.search('el')[0]['label'], 'Elena')
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении объектов."""
+        index.search('a')
+        self.group.title = 'Собаководы'
+        self.group.save()
+        author = User.objects.create(username='Dmitry')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [result['label'] for result in index.search('d')],
+                ['Dmitry']
+            )
+            self.assertEqual(
+                [result['label'] for result in index.search('соб')],
+                ['Собаководы']
+            )
+            self.assertEqual(index.search('люб'), [])
+        author.delete()
+        self.assertEqual(index.search('d'), [])
+
+    def test_rebuild_when_other_process_changed_index(self):
+        """Индекс перестраивается, если его версия в кэше сменилась."""
+        index.search('a')
+        User.objects.bulk_create([User(username='Boris')])
+        self.assertEqual(index.search('b'), [])
+        cache.clear()
+        self.assertEqual(index.search('b')[0]['label'], 'Boris')
+
+    def test_changes_reach_other_process_without_rebuild(self):
+        """Индекс другого процесса применяет изменения из кэша
+        без обращения к БД."""
+        other = PrefixIndex()
+        other.search('a')
+        User.objects.create(username='Zoya')
+        self.group.title = 'Собаководы'
+        self.group.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.search('zo')[0]['label'], 'Zoya')
+            self.assertEqual(other.search('люб'), [])
+
+    def test_update_before_build_keeps_index_complete(self):
+        """Изменение в процессе, который еще не строил индекс,
+        не мешает построить его целиком."""
+        User.objects.bulk_create([
+            User(username='alice'), User(username='bob')
+        ])
+        cache.clear()
+        fresh = PrefixIndex()
+        fresh.update(USER, User.objects.create(username='carol'))
+        self.assertEqual(fresh.search('al')[0]['label'], 'alice')
+        self.assertEqual(fresh.search('car')[0]['label'], 'carol')
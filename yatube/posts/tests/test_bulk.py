@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import bulk
+from ..models import Comment, Follow, Group, Post, User
+
+
+class BulkDataTests(TestCase):
+    """Тестирует выгрузку и загрузку данных командами
+    export_data и import_data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        cls.author = User.objects.create(username='Elena')
+        cls.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Запись {i}', author=cls.author, group=cls.group
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+
+    def export(self, kind, file_format):
+        path = os.path.join(self.data_dir, f'{kind}.{file_format}')
+        call_command(
+            'export_data', kind, format=file_format, output=path, verbosity=0
+        )
+        return path
+
+    def load(self, kind, path, **options):
+        call_command(
+            'import_data', kind, path, stdout=StringIO(), verbosity=0,
+            **options
+        )
+
+    def get_posts(self):
+        return list(Post.objects.order_by('pk').values_list(
+            'pk', 'text', 'pub_date', 'author', 'group'
+        ))
+
+    def test_round_trip(self):
+        """Выгруженные записи и комментарии загружаются обратно
+        с прежними ключами и датами."""
+        for file_format in ('ndjson', 'csv'):
+            with self.subTest(file_format=file_format):
+                posts = self.get_posts()
+                comments = list(Comment.objects.values_list(
+                    'pk', 'post', 'author', 'text', 'created'
+                ))
+                posts_path = self.export('posts', file_format)
+                comments_path = self.export('comments', file_format)
+                Post.objects.all().delete()
+                self.load('posts', posts_path)
+                self.load('comments', comments_path)
+                self.assertEqual(self.get_posts(), posts)
+                self.assertEqual(list(Comment.objects.values_list(
+                    'pk', 'post', 'author', 'text', 'created'
+                )), comments)
+
+    def test_import_keeps_auto_now_add(self):
+        """Загрузка не выключает auto_now_add у модели: записи, которые
+        другие потоки создают одновременно с ней, получают текущую дату."""
+        field = Post._meta.get_field('pub_date')
+        flags = []
+
+        def insert_objects(*args):
+            flags.append(field.auto_now_add)
+            return original(*args)
+
+        original = bulk.insert_objects
+        path = self.export('posts', 'ndjson')
+        Post.objects.all().delete()
+        with mock.patch.object(bulk, 'insert_objects', insert_objects):
+            self.load('posts', path)
+        self.assertEqual(flags, [True])
+        self.assertEqual(
+            [post[2] for post in self.get_posts()],
+            [post.pub_date for post in self.posts]
+        )
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка пропускает уже существующие строки."""
+        path = self.export('follows', 'ndjson')
+        self.load('follows', path)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_invalid_rows_are_reported(self):
+        """Дата без времени дополняется часовым поясом, а строки
+        с пустыми обязательными полями и неверными значениями
+        не пропадают молча, а попадают в отчет."""
+        path = os.path.join(self.data_dir, 'posts.ndjson')
+        rows = (
+            {'text': 'Только дата', 'pub_date': '2024-01-02',
+             'author': self.author.pk},
+            {'text': 'Без даты', 'author': self.author.pk},
+            {'text': 'Без автора', 'pub_date': '2024-01-02T00:00:00+00:00'},
+            {'text': 'Неверная дата', 'pub_date': 'вчера',
+             'author': self.author.pk},
+        )
+        with open(path, 'w', encoding='utf-8') as stream:
+            for row in rows:
+                stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        stderr = StringIO()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            call_command(
+                'import_data', 'posts', path, stdout=StringIO(),
+                stderr=stderr
+            )
+        self.assertFalse([
+            warning for warning in caught if 'naive' in str(warning.message)
+        ])
+        post = Post.objects.get(text='Только дата')
+        self.assertEqual(post.pub_date.date().isoformat(), '2024-01-02')
+        self.assertEqual(Post.objects.count(), len(self.posts) + 1)
+        self.assertIn('некорректных 3', stderr.getvalue())
+        self.assertIn('неверными значениями: 3.', stderr.getvalue())
+
+    def test_checkpoint_resume(self):
+        """Загрузка продолжается с позиции из файла контрольной точки."""
+        path = self.export('posts', 'ndjson')
+        Post.objects.all().delete()
+        checkpoint = os.path.join(self.data_dir, 'posts.checkpoint')
+        with open(checkpoint, 'w') as stream:
+            stream.write('3')
+        self.load('posts', path, batch_size=1, checkpoint=checkpoint)
+        self.assertEqual(
+            [post[0] for post in self.get_posts()],
+            [post.pk for post in self.posts[3:]]
+        )
+        with open(checkpoint) as stream:
+            self.assertEqual(stream.read(), '5')
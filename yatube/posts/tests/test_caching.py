@@ -0,0 +1,299 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import views
+from ..caching import ETAG_KEY, invalidate_tags, post_tag
+from ..models import Comment, Group, Post, User
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Тестирует кэширование страниц для анонимных пользователей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovaya-gruppa',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Какая-то тестовая запись',
+            author=cls.user,
+            group=cls.group
+        )
+        cls.pages = [
+            reverse('posts:posts_list'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_cached_page_skips_database(self):
+        """Повторный запрос анонима отдается из кэша без запросов к БД."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                with self.assertNumQueries(0):
+                    cached_response = self.client.get(page)
+                self.assertEqual(response.content, cached_response.content)
+
+    def test_post_edit_invalidates_pages(self):
+        """Изменение записи сбрасывает кэш всех страниц с ней."""
+        for page in self.pages:
+            self.client.get(page)
+        self.post.text = 'Измененная запись'
+        self.post.save()
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                self.assertContains(response, 'Измененная запись')
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий сбрасывает кэш страницы поста."""
+        page = self.pages[-1]
+        self.client.get(page)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий'
+        )
+        self.assertContains(self.client.get(page), 'Новый комментарий')
+
+    def test_group_change_invalidates_group_page(self):
+        """Изменение сообщества сбрасывает кэш его страницы."""
+        page = self.pages[1]
+        self.client.get(page)
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.assertContains(self.client.get(page), 'Новое описание')
+
+    def test_author_name_change_invalidates_pages(self):
+        """Смена имени автора сбрасывает кэш страниц с его записями,
+        а обновление last_login при входе - нет."""
+        for page in self.pages:
+            self.client.get(page)
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+        self.user.first_name = 'Елена'
+        self.user.last_name = 'Смурова'
+        self.user.save()
+        for page in self.pages:
+            with self.subTest(page=page):
+                self.assertContains(self.client.get(page), 'Елена Смурова')
+
+    def test_change_during_render_is_not_cached(self):
+        """Страница, чьи теги сброшены во время рендеринга, не попадает
+        в кэш под новыми версиями."""
+        page = self.pages[-1]
+
+        def render(*args, **kwargs):
+            invalidate_tags(post_tag(self.post.pk))
+            return original(*args, **kwargs)
+
+        original = views.render
+        with mock.patch.object(views, 'render', render):
+            response = self.client.get(page)
+        self.assertNotIn('ETag', response)
+        self.assertIsNotNone(self.client.get(page).context)
+
+    def test_authorized_pages_are_not_cached(self):
+        """Авторизованный пользователь получает свежую страницу."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                self.authorized_client.get(page)
+                response = self.authorized_client.get(page)
+                self.assertIsNotNone(response.context)
+
+
+class ConditionalGetTests(TestCase):
+    """Тестирует условные GET-запросы к HTML-страницам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.reader = User.objects.create(
+            username='reader'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovaya-gruppa',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Какая-то тестовая запись',
+            author=cls.user,
+            group=cls.group
+        )
+        cls.pages = [
+            reverse('posts:posts_list'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_not_modified_skips_view(self):
+        """Запрос с актуальным ETag получает 304 без запросов к БД."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                self.assertEqual(
+                    response['Last-Modified'],
+                    self.post.pub_date.strftime('%a, %d %b %Y %H:%M:%S GMT')
+                )
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        page, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def evict_etags(self):
+        # Ключи LocMemCache хранятся с префиксом и версией: ":1:etag:...".
+        cache.delete_many([
+            key.split(':', 2)[2] for key in list(cache._cache)
+            if key.split(':', 2)[2].startswith(ETAG_KEY.format(''))
+        ])
+
+    def test_validators_survive_evicted_etag(self):
+        """Если запись ETag вытеснена из кэша, а страница осталась,
+        ответ из кэша страниц все равно получает ETag и Last-Modified,
+        а по ним отвечается 304."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                cache.clear()
+                response = self.client.get(page)
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+                self.evict_etags()
+                with self.assertNumQueries(0):
+                    response = self.client.get(page)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response['Last-Modified'], last_modified)
+                self.evict_etags()
+                response = self.client.get(
+                    page, HTTP_IF_MODIFIED_SINCE=last_modified
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_comment_changes_etag(self):
+        """Новый комментарий меняет ETag страниц с записью."""
+        etags = {page: self.client.get(page)['ETag'] for page in self.pages}
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = self.client.get(page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Комментарий')
+
+    def test_etag_depends_on_user(self):
+        """ETag страницы свой у каждого пользователя и меняется
+        после подписки."""
+        page = self.pages[2]
+        etag = self.client.get(page)['ETag']
+        response = self.authorized_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.authorized_client.get(
+            reverse(
+                'posts:profile_follow',
+                kwargs={'username': self.user.username}
+            )
+        )
+        response = self.authorized_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_etag_depends_on_csrf_token(self):
+        """После смены CSRF-токена, например при повторном входе,
+        страница с формой комментария отдается заново."""
+        page = self.pages[3]
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        etag = self.authorized_client.get(page)['ETag']
+        response = self.authorized_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = self.authorized_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TaggedFragmentCacheTests(TestCase):
+    """Тестирует сброс фрагментов {% tagged_cache %} по зависимостям."""
+
+    FRAGMENT = Template(
+        '{% load tagged_cache %}'
+        '{% tagged_cache 900 fragment post.pk %}'
+        '{% cache_depends post %}{{ post.text }}'
+        '{% endtagged_cache %}'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.post1 = Post.objects.create(
+            text='Первая запись',
+            author=cls.user
+        )
+        cls.post2 = Post.objects.create(
+            text='Вторая запись',
+            author=User.objects.create(username='another')
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def render(self, post):
+        return self.FRAGMENT.render(Context({'post': post}))
+
+    def test_save_purges_only_dependent_fragments(self):
+        """Изменение записи сбрасывает только фрагменты с этой записью."""
+        self.render(self.post1)
+        self.render(self.post2)
+        self.post1.text = 'Измененная запись'
+        self.post1.save()
+        self.post2.text = 'Не сохраненный текст'
+        self.assertEqual(self.render(self.post1), 'Измененная запись')
+        self.assertEqual(self.render(self.post2), 'Вторая запись')
+
+    def test_change_during_render_is_not_cached(self):
+        """Фрагмент, чьи теги сброшены во время рендеринга, рендерится
+        заново."""
+        post = Post.objects.get(pk=self.post1.pk)
+        post.text = lambda: invalidate_tags(post_tag(post.pk)) or 'Старый'
+        self.assertEqual(self.render(post), 'Старый')
+        self.assertEqual(self.render(self.post1), 'Первая запись')
+
+    def test_delete_purges_feed_fragment(self):
+        """Удаление записи убирает ее из закэшированной ленты."""
+        url = reverse('posts:posts_list')
+        self.assertContains(self.authorized_client.get(url), 'Первая запись')
+        self.post1.delete()
+        self.assertNotContains(
+            self.authorized_client.get(url), 'Первая запись'
+        )
@@ -0,0 +1,89 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, PostCounter, User
+
+
+class PostCounterTests(TestCase):
+    """Тестирует счетчики записей авторов и сообществ."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.group1 = Group.objects.create(
+            title='Тестовая группа 1',
+            slug='testovaya-gruppa-1',
+            description='Тестовое описание 1',
+        )
+        cls.group2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='testovaya-gruppa-2',
+            description='Тестовое описание 2',
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(
+            text='Какая-то тестовая запись',
+            author=self.user,
+            group=self.group1
+        )
+
+    def assertCounts(self, author, group1, group2):
+        self.assertEqual(
+            PostCounter.objects.get_count(author=self.user), author
+        )
+        self.assertEqual(
+            PostCounter.objects.get_count(group=self.group1), group1
+        )
+        self.assertEqual(
+            PostCounter.objects.get_count(group=self.group2), group2
+        )
+
+    def test_counters_follow_create(self):
+        """Новая запись увеличивает счетчики автора и сообщества."""
+        self.assertCounts(1, 1, 0)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост в форме', 'group': self.group2.id}
+        )
+        self.assertCounts(2, 1, 1)
+
+    def test_counters_follow_group_change(self):
+        """Смена сообщества переносит запись между счетчиками."""
+        self.assertCounts(1, 1, 0)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Новая запись', 'group': self.group2.id}
+        )
+        self.assertCounts(1, 0, 1)
+
+    def test_counters_follow_delete(self):
+        """Удаление записи уменьшает счетчики."""
+        self.assertCounts(1, 1, 0)
+        self.post.delete()
+        self.assertCounts(0, 0, 0)
+
+    def test_profile_does_not_count_posts(self):
+        """Страница профиля берет число записей из счетчика."""
+        PostCounter.objects.update_or_create(
+            author=self.user, defaults={'posts_count': 7}
+        )
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count, 7)
+
+    def test_rebuild_post_counters(self):
+        """Команда rebuild_post_counters пересчитывает счетчики с нуля."""
+        self.assertCounts(1, 1, 0)
+        Post.objects.filter(pk=self.post.pk).update(group=self.group2)
+        call_command('rebuild_post_counters', stdout=StringIO())
+        self.assertCounts(1, 0, 1)
@@ -1,11 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.models import Group, Post, User
+from posts.uploads import normalize_image
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -122,6 +126,43 @@ class PostFormTests(TestCase):
         post = Post.objects.get(pk=self.post.id)
         self.assertEqual(post.text, form_data['text'])
 
+    def test_uploaded_image_normalized(self):
+        """Загруженная картинка поворачивается по EXIF, уменьшается
+        и перекодируется в JPEG без метаданных."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        content = BytesIO()
+        Image.new('RGB', (3000, 1000)).save(content, 'jpeg', exif=exif)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с большой картинкой',
+                'image': SimpleUploadedFile(
+                    name='big.jpeg',
+                    content=content.getvalue(),
+                    content_type='image/jpeg'
+                )
+            }
+        )
+        post = Post.objects.get(text='Пост с большой картинкой')
+        self.assertEqual(post.image.name, 'posts/big.jpg')
+        normalize_image(post.image.name, default_storage)
+        with Image.open(default_storage.path(post.image.name)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(
+                image.size, (640, settings.POST_IMAGE_MAX_SIZE)
+            )
+            self.assertNotIn('exif', image.info)
+
+    def test_small_image_normalized_on_upload(self):
+        """Небольшая картинка перекодируется в JPEG сразу при загрузке."""
+        self.create_post_with_picture(self.authorized_client)
+        post = Post.objects.latest('pk')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.mode, 'RGB')
+
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import live
+from ..models import Follow, Post, User
+from ..utils import encode_cursor
+
+
+class LiveFeedTests(TestCase):
+    """Тестирует живую ленту новых записей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.other = User.objects.create(
+            username='Dmitry'
+        )
+        cls.reader = User.objects.create(
+            username='reader'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(text='Первая запись', author=cls.user)
+
+    def setUp(self):
+        patcher = mock.patch.object(live, 'hub', live.LocalHub())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def open_stream(self, client, url, **extra):
+        response = client.get(url, **extra)
+        self.addCleanup(response.close)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertTrue(next(chunks).startswith(b'retry:'))
+        return chunks
+
+    @mock.patch.object(live, 'LIVE_FEED_KEEPALIVE', 0.01)
+    def test_new_post_is_streamed(self):
+        """Новая запись приходит в поток, пока событий нет - keepalive."""
+        chunks = self.open_stream(
+            self.authorized_client, reverse('posts:live_feed')
+        )
+        self.assertEqual(next(chunks), b': keepalive\n\n')
+        with mock.patch('posts.signals.transaction.on_commit') as on_commit:
+            post = Post.objects.create(text='Новая запись', author=self.other)
+        on_commit.call_args[0][0]()
+        cursor = encode_cursor(post)
+        self.assertEqual(
+            next(chunks).decode(),
+            f'id: {cursor}\nevent: post\n'
+            f'data: {{"id": {post.pk}, "author": {self.other.pk}, '
+            f'"cursor": "{cursor}"}}\n\n'
+        )
+
+    @mock.patch.object(live, 'LIVE_FEED_KEEPALIVE', 0.01)
+    def test_follow_stream_filters_authors(self):
+        """Поток подписок пропускает записи других авторов."""
+        chunks = self.open_stream(
+            self.authorized_client, reverse('posts:follow_live_feed')
+        )
+        live.hub.publish({'id': 100, 'author': self.other.pk, 'cursor': 'a'})
+        live.hub.publish({'id': 101, 'author': self.user.pk, 'cursor': 'b'})
+        self.assertTrue(next(chunks).startswith(b'id: b\n'))
+
+    def test_missed_events_are_replayed(self):
+        """По Last-Event-ID поток начинается с пропущенных записей."""
+        post = Post.objects.create(text='Пропущенная', author=self.user)
+        Post.objects.create(text='Чужая', author=self.other)
+        chunks = self.open_stream(
+            self.authorized_client,
+            reverse('posts:follow_live_feed'),
+            HTTP_LAST_EVENT_ID=encode_cursor(self.post)
+        )
+        self.assertTrue(
+            next(chunks).startswith(f'id: {encode_cursor(post)}\n'.encode())
+        )
+
+    @mock.patch.object(live, 'LIVE_FEED_MAX_DURATION', 0)
+    def test_stream_is_closed(self):
+        """Поток закрывается по истечении LIVE_FEED_MAX_DURATION."""
+        chunks = self.open_stream(
+            self.authorized_client, reverse('posts:live_feed')
+        )
+        self.assertEqual(list(chunks), [])
+        self.assertEqual(live.hub._subscribers, set())
+
+    def test_anonymous_is_redirected(self):
+        """Анонимный пользователь не занимает поток сервера."""
+        response = self.client.get(reverse('posts:live_feed'))
+        self.assertEqual(response.status_code, 302)
+
+    @mock.patch.object(live, 'LIVE_FEED_MAX_STREAMS', 1)
+    def test_streams_are_limited(self):
+        """Сверх LIVE_FEED_MAX_STREAMS поток не открывается, закрытый
+        поток освобождает место."""
+        url = reverse('posts:live_feed')
+        response = self.authorized_client.get(url)
+        busy = self.authorized_client.get(url)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy['Retry-After'], str(live.LIVE_FEED_BUSY_RETRY))
+        response.close()
+        response.close()
+        self.open_stream(self.authorized_client, url)
+        self.assertEqual(live._streams, 1)
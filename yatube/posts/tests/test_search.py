@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import SEARCH_TABLE, search_posts
+from ..utils import NUMBER_POSTS
+
+
+class SearchTests(TestCase):
+    """Тестирует полнотекстовый поиск по записям."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        cls.post = Post.objects.create(
+            text='Рецепт борща: свекла, капуста и немного укропа',
+            author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Борщ, борщ и еще раз борщ! Без свеклы никак',
+            author=cls.user
+        )
+        Post.objects.create(
+            text='Заметки о походе в горы',
+            author=cls.user
+        )
+
+    def search(self, query):
+        return list(search_posts(Post.objects.all(), query))
+
+    def test_search_ranks_results(self):
+        """Найдены только подходящие записи, более релевантные первыми."""
+        self.assertEqual(self.search('борщ'), [self.other, self.post])
+        self.assertEqual(self.search('БОРЩ свекла'), [self.post])
+
+    def test_search_by_prefix(self):
+        """Слова запроса ищутся как префиксы."""
+        self.assertEqual(self.search('капу'), [self.post])
+
+    def test_search_ignores_query_syntax(self):
+        """Служебные символы FTS5 в запросе не ломают поиск."""
+        self.assertEqual(self.search('"укроп*" ('), [self.post])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при изменении и удалении записи."""
+        post = Post.objects.create(text='Черновик', author=self.user)
+        self.assertEqual(self.search('черновик'), [post])
+        post.text = 'Окончательный текст'
+        post.save()
+        self.assertEqual(self.search('черновик'), [])
+        self.assertEqual(self.search('окончательный'), [post])
+        post.delete()
+        self.assertEqual(self.search('окончательный'), [])
+
+    def test_rebuild_search_index(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        Post.objects.filter(pk=self.post.pk).update(text='Пельмени')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('пельмени'), [self.post])
+        self.assertEqual(self.search('капуста'), [])
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные записи постранично."""
+        Post.objects.bulk_create(
+            Post(text=f'Еще один борщ {i}', author=self.user)
+            for i in range(NUMBER_POSTS)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'борщ'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, NUMBER_POSTS + 2)
+        self.assertEqual(len(page_obj), NUMBER_POSTS)
+        self.assertContains(response, '?q=%D0%B1%D0%BE%D1%80%D1%89&page=2')
+
+    def test_search_table_exists(self):
+        """Миграция создает таблицу индекса и переносит в нее записи."""
+        self.assertIn(SEARCH_TABLE, connection.introspection.table_names())
@@ -0,0 +1,256 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..live import get_missed_events
+from ..models import Comment, Follow, Group, Post, PostCounter, User
+from ..sharding import SHARD_ID_RANGE, get_shard, init_sequences
+from ..utils import NUMBER_POSTS, encode_cursor
+
+SHARDS = ['shard_1', 'shard_2']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    """Тестирует хранение записей на шардах. Шардами служат отдельные
+    файлы SQLite."""
+
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shards_dir = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                **connections.databases['default'],
+                'NAME': os.path.join(cls.shards_dir, f'{alias}.sqlite3'),
+            }
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+        for alias in SHARDS:
+            init_sequences(alias)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание',
+        )
+        cls.first = User.objects.create(username='Elena')
+        cls.second = User.objects.create(username='Dmitry')
+        cls.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.first)
+        for i in range(NUMBER_POSTS):
+            Post.objects.create(
+                text=f'Запись {i}',
+                author=(cls.first, cls.second)[i % 2],
+                group=cls.group
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.shards_dir, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def get_posts(self, alias):
+        return Post.objects.using(alias).order_by('pk')
+
+    def test_posts_stored_on_author_shard(self):
+        """Записи хранятся на шарде автора с ключами из его диапазона."""
+        self.assertFalse(Post.objects.using('default').exists())
+        for author in (self.first, self.second):
+            with self.subTest(author=author.username):
+                alias = get_shard(author.pk)
+                posts = self.get_posts(alias).filter(author=author)
+                self.assertEqual(posts.count(), NUMBER_POSTS // 2)
+                start = (SHARDS.index(alias) + 1) * SHARD_ID_RANGE
+                self.assertTrue(all(post.pk > start for post in posts))
+
+    def test_index_merges_shards(self):
+        """Главная страница объединяет записи шардов по дате."""
+        response = self.client.get(reverse('posts:posts_list'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, NUMBER_POSTS)
+        self.assertEqual(
+            [post.text for post in page_obj],
+            [f'Запись {i}' for i in reversed(range(NUMBER_POSTS))]
+        )
+        self.assertEqual(
+            {post.author for post in page_obj}, {self.first, self.second}
+        )
+
+    def test_index_cursor_pages(self):
+        """Страницы по токену after продолжают объединенную ленту."""
+        Post.objects.create(text='Новая запись', author=self.second)
+        url = reverse('posts:posts_list')
+        page_obj = self.client.get(url).context['page_obj']
+        self.assertEqual(page_obj[0].text, 'Новая запись')
+        page_obj = self.client.get(
+            url, {'after': page_obj.next_cursor}
+        ).context['page_obj']
+        self.assertEqual([post.text for post in page_obj], ['Запись 0'])
+
+    def test_group_and_search_merge_shards(self):
+        """Страница сообщества и поиск находят записи всех шардов."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:search') + '?q=Запись',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                page_obj = self.client.get(url).context['page_obj']
+                self.assertEqual(page_obj.paginator.count, NUMBER_POSTS)
+                self.assertEqual(
+                    {post.author for post in page_obj},
+                    {self.first, self.second}
+                )
+
+    def test_user_copies(self):
+        """Имя пользователя копируется на шарды, а last_login при
+        входе - нет."""
+        user = User.objects.get(pk=self.second.pk)
+        with CaptureQueriesContext(connections[SHARDS[0]]) as queries:
+            self.client.force_login(user)
+        self.assertEqual(len(queries), 0)
+        user.first_name = 'Дмитрий'
+        user.save(update_fields=['first_name'])
+        for alias in SHARDS:
+            with self.subTest(alias=alias):
+                copy = User.objects.using(alias).get(pk=user.pk)
+                self.assertEqual(copy.first_name, 'Дмитрий')
+                self.assertIsNone(copy.last_login)
+
+    def test_profile_reads_one_shard(self):
+        """Профиль читает записи только с шарда автора."""
+        other = SHARDS[1 - SHARDS.index(get_shard(self.first.pk))]
+        PostCounter.objects.get_count(author=self.first)
+        with CaptureQueriesContext(connections[other]) as queries:
+            response = self.client.get(
+                reverse('posts:profile', kwargs={'username': 'Elena'})
+            )
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(
+            {post.author for post in response.context['page_obj']},
+            {self.first}
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+
+    def test_comment_stored_with_post(self):
+        """Комментарий хранится на шарде записи и виден на ее странице."""
+        post = self.get_posts(get_shard(self.second.pk)).first()
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'}
+        )
+        self.assertTrue(Comment.objects.using(post._state.db).exists())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(response.context['post'], post)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий']
+        )
+
+    def test_follow_index(self):
+        """Лента подписок собирается с шардов подписок."""
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            {post.author for post in response.context['page_obj']},
+            {self.first}
+        )
+
+    def test_live_missed_events_merge_shards(self):
+        """Пропущенные события берутся со всех шардов по дате записи,
+        хотя ключи у шардов идут из разных диапазонов."""
+        first, second = sorted(
+            (self.first, self.second), key=lambda user: get_shard(user.pk)
+        )
+        seen = Post.objects.create(text='Увиденная', author=second)
+        missed = Post.objects.create(text='Пропущенная', author=first)
+        self.assertLess(missed.pk, seen.pk)
+        events = get_missed_events(encode_cursor(seen))
+        self.assertEqual([event['id'] for event in events], [missed.pk])
+
+    def test_import_reports_orphan_comments(self):
+        """Комментарии к записям, которых нет на шардах, пропускаются
+        и попадают в отчет загрузки."""
+        alias = get_shard(self.first.pk)
+        post = self.get_posts(alias).filter(author=self.first).first()
+        path = os.path.join(self.shards_dir, 'comments.ndjson')
+        with open(path, 'w', encoding='utf-8') as stream:
+            for post_id in (post.pk, post.pk + 10 ** 6):
+                stream.write(json.dumps({
+                    'post': post_id,
+                    'author': self.reader.pk,
+                    'text': 'Загруженный',
+                    'created': '2024-01-01T00:00:00+00:00',
+                }) + '\n')
+        stderr = StringIO()
+        call_command(
+            'import_data', 'comments', path, stdout=StringIO(), stderr=stderr
+        )
+        self.assertIn('пропущено без записи 1', stderr.getvalue())
+        self.assertIn('ни на одном шарде: 1', stderr.getvalue())
+        self.assertEqual(
+            Comment.objects.using(alias).filter(text='Загруженный').count(), 1
+        )
+
+    def test_generate_thumbnails_reads_shards(self):
+        """Миниатюры создаются для картинок записей всех шардов."""
+        for alias in SHARDS:
+            Post.objects.using(alias).filter(
+                pk=self.get_posts(alias).first().pk
+            ).update(image=f'posts/{alias}.png')
+        with mock.patch(
+            'posts.management.commands.generate_thumbnails'
+            '.generate_thumbnails'
+        ) as generate:
+            call_command('generate_thumbnails', stdout=StringIO())
+        self.assertEqual(
+            sorted(call.args[0] for call in generate.call_args_list),
+            [f'posts/{alias}.png' for alias in SHARDS]
+        )
+
+    def test_rebalance(self):
+        """Перебалансировка переносит записи и комментарии
+        на шарды авторов."""
+        alias = get_shard(self.first.pk)
+        other = SHARDS[1 - SHARDS.index(alias)]
+        post = Post(text='Чужой шард', author=self.first)
+        Post.objects.using(other).bulk_create([post])
+        post = Post.objects.using(other).get(text='Чужой шард')
+        Comment.objects.using(other).bulk_create([
+            Comment(post=post, author=self.reader, text='Комментарий')
+        ])
+        comment = Comment.objects.using(other).get(post=post)
+        call_command('rebalance_shards', stdout=StringIO())
+        self.assertFalse(self.get_posts(other).filter(pk=post.pk).exists())
+        self.assertEqual(
+            self.get_posts(alias).get(pk=post.pk).pub_date, post.pub_date
+        )
+        self.assertEqual(
+            Comment.objects.using(alias).get(post_id=post.pk).created,
+            comment.created
+        )
+        self.assertEqual(
+            PostCounter.objects.get(author=self.first).posts_count,
+            NUMBER_POSTS // 2 + 1
+        )
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from ..models import Post, User
+from ..thumbnails import generate_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    """Тестирует подготовку миниатюр вне запроса."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='Elena'
+        )
+        image = BytesIO()
+        Image.new('RGB', (100, 50), color=(255, 0, 0)).save(image, 'png')
+        cls.post = Post.objects.create(
+            text='Какая-то тестовая запись',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='small.png',
+                content=image.getvalue(),
+                content_type='image/png'
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(
+            os.path.join(TEMP_MEDIA_ROOT, 'cache'), ignore_errors=True
+        )
+
+    def get_image_src(self):
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        content = response.content.decode()
+        start = content.index('<img class="card-img my-2" src="') + 32
+        return content[start:content.index('"', start)]
+
+    def test_original_image_until_thumbnail_ready(self):
+        """Пока миниатюры нет, выводится исходная картинка."""
+        self.assertEqual(self.get_image_src(), self.post.image.url)
+
+    def test_thumbnail_after_generation(self):
+        """После подготовки выводится готовая миниатюра."""
+        generate_thumbnails(self.post.image.name)
+        src = self.get_image_src()
+        self.assertNotEqual(src, self.post.image.url)
+        self.assertTrue(src.startswith(settings.MEDIA_URL + 'cache/'))
+
+    def test_cached_pages_get_thumbnail(self):
+        """Готовая миниатюра сбрасывает кэш страниц с исходной картинкой."""
+        urls = (
+            reverse('posts:posts_list'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            self.assertNotContains(
+                self.client.get(url), settings.MEDIA_URL + 'cache/'
+            )
+        generate_thumbnails(self.post.image.name, post_ids=[self.post.pk])
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), settings.MEDIA_URL + 'cache/'
+                )
+
+    def test_feed_finds_thumbnails_in_one_cache_request(self):
+        """Лента ищет миниатюры всех записей одним запросом к кэшу."""
+        generate_thumbnails(self.post.image.name)
+        with mock.patch.object(
+            default.kvstore, 'get_many', wraps=default.kvstore.get_many
+        ) as get_many, mock.patch.object(
+            default.kvstore, 'get', wraps=default.kvstore.get
+        ) as get:
+            response = self.authorized_client.get(reverse('posts:posts_list'))
+        get_many.assert_called_once()
+        get.assert_not_called()
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
@@ -0,0 +1,160 @@
+from importlib import import_module
+from unittest import mock
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User
+from ..timeline import TIMELINE_ORDERING, get_timeline
+from ..utils import NUMBER_POSTS
+
+
+class TimelineTests(TestCase):
+    """Тестирует материализованную ленту подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(
+            username='reader'
+        )
+        cls.author = User.objects.create(
+            username='author'
+        )
+
+    def get_timeline(self):
+        return list(get_timeline(self.reader).order_by(*TIMELINE_ORDERING))
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новая запись попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Запись', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.get_timeline(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет прошлые записи автора, отписка их убирает."""
+        post = Post.objects.create(text='Запись', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.get_timeline(), [post])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_timeline(), [])
+
+    @mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 0)
+    def test_popular_author_is_pulled(self):
+        """Записи популярного автора подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Запись', author=self.author)
+        self.assertTrue(post.pulled)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_timeline(), [post])
+
+    def test_pulled_posts_stay_after_author_drops_below_limit(self):
+        """Записи, сделанные в режиме чтения без раскладки, остаются
+        в ленте, когда подписчиков у автора стало меньше порога."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 0):
+            pulled = Post.objects.create(text='Раньше', author=self.author)
+        pushed = Post.objects.create(text='Позже', author=self.author)
+        self.assertFalse(pushed.pulled)
+        self.assertEqual(self.get_timeline(), [pushed, pulled])
+
+    def test_pages_merge_entries_and_pulled_posts(self):
+        """Страницы по токену after обходят разложенные и подмешанные
+        записи по дате без пропусков и повторов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = []
+        for number in range(NUMBER_POSTS * 2 + 3):
+            with mock.patch(
+                'posts.timeline.FANOUT_FOLLOWERS_LIMIT', number % 2 - 1
+            ):
+                posts.append(Post.objects.create(
+                    text=f'Запись {number}', author=self.author
+                ))
+        self.client.force_login(self.reader)
+        url = reverse('posts:follow_index')
+        seen = []
+        page_obj = self.client.get(url).context['page_obj']
+        seen += page_obj.object_list
+        while page_obj.has_next():
+            page_obj = self.client.get(
+                url, {'after': page_obj.next_cursor}
+            ).context['page_obj']
+            seen += page_obj.object_list
+        self.assertEqual(seen, posts[::-1])
+        self.assertEqual(
+            self.client.get(url, {'page': 3}).context['page_obj'].object_list,
+            posts[2::-1]
+        )
+
+    def test_pulled_post_is_not_duplicated(self):
+        """Подмешанная запись, для которой осталась строка ленты,
+        выводится и считается один раз."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 0):
+            post = Post.objects.create(text='Запись', author=self.author)
+        TimelineEntry.objects.create(
+            user=self.reader, post=post, pub_date=post.pub_date
+        )
+        self.assertEqual(self.get_timeline(), [post])
+        self.assertEqual(get_timeline(self.reader).count(), 1)
+
+    def test_entries_read_by_index(self):
+        """Страница ленты читается по индексу без сортировки."""
+        entries = get_timeline(self.reader).querysets['entries'].order_by(
+            *TIMELINE_ORDERING
+        )[:NUMBER_POSTS]
+        sql, params = entries.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('timeline_user_date_post_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class TimelineMigrationTests(TransactionTestCase):
+    """Тестирует перевод существующей ленты на подмешиваемые записи."""
+
+    migrate_from = [('posts', '0016_post_search')]
+    migrate_to = [('posts', '0017_timeline_pulled_posts')]
+
+    def tearDown(self):
+        # Следующие тесты ждут схему последней миграции.
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_pulled_posts_leave_timeline(self):
+        """Записи популярного автора помечаются подмешиваемыми, а их
+        строки ленты удаляются, поэтому в ленте они выводятся один раз."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        OldUser = apps.get_model('auth', 'User')
+        OldFollow = apps.get_model('posts', 'Follow')
+        OldPost = apps.get_model('posts', 'Post')
+        OldEntry = apps.get_model('posts', 'TimelineEntry')
+        reader = OldUser.objects.create(username='reader')
+        author = OldUser.objects.create(username='author')
+        OldFollow.objects.create(user=reader, author=author)
+        post = OldPost.objects.create(text='Запись', author=author)
+        OldEntry.objects.create(
+            user=reader, post=post, pub_date=post.pub_date
+        )
+        migration = import_module(
+            'posts.migrations.0017_timeline_pulled_posts'
+        )
+        with mock.patch.object(migration, 'FANOUT_FOLLOWERS_LIMIT', 0):
+            executor = MigrationExecutor(connection)
+            executor.migrate(self.migrate_to)
+        self.assertFalse(TimelineEntry.objects.exists())
+        timeline = get_timeline(User.objects.get(pk=reader.pk))
+        self.assertEqual(
+            [entry.pk for entry in timeline.order_by(*TIMELINE_ORDERING)],
+            [post.pk]
+        )
+        self.assertEqual(timeline.count(), 1)
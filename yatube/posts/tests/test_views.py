@@ -1,17 +1,21 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db import models
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import IntegrityError, connection, models
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Comment, Follow, Group, Post
+from posts.models import (LATEST_COMMENTS, Comment, Follow, Group, Post,
+                          PostCounter)
 
-from ..utils import NUMBER_POSTS
+from ..utils import NUMBER_COMMENTS, NUMBER_POSTS, get_page_paginator
 
 NUMBER_POSTS_TEST = 13
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -196,6 +200,7 @@ class PaginatorViewsTest(TestCase):
         ]
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
 
     def test_first_page_contains_ten_records(self):
@@ -214,6 +219,40 @@ class PaginatorViewsTest(TestCase):
                     response.context['page_obj']
                 ), NUMBER_POSTS_TEST - NUMBER_POSTS)
 
+    def test_second_page_by_cursor(self):
+        """Страница ?after= продолжает первую страницу без повторов."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                first_page = self.client.get(page).context['page_obj']
+                response = self.client.get(
+                    page + '?after=' + first_page.next_cursor
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(
+                    len(second_page), NUMBER_POSTS_TEST - NUMBER_POSTS
+                )
+                self.assertFalse(second_page.has_next())
+                self.assertFalse(
+                    set(first_page.object_list)
+                    & set(second_page.object_list)
+                )
+
+    def test_cursor_page_uses_one_query(self):
+        """Страница по токену выбирается одним запросом, без COUNT(*)."""
+        request = RequestFactory().get('/')
+        first_page = get_page_paginator(request, Post.objects.all())
+        request = RequestFactory().get(
+            '/', {'after': first_page.next_cursor}
+        )
+        with self.assertNumQueries(1):
+            page = get_page_paginator(request, Post.objects.all())
+            self.assertEqual(len(page), NUMBER_POSTS_TEST - NUMBER_POSTS)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Поврежденный токен возвращает первую страницу."""
+        response = self.client.get(self.pages[0] + '?after=broken')
+        self.assertEqual(response.context['page_obj'].number, 1)
+
 
 class PostInGroupTest(TestCase):
     """Тестирует создание поста с указанием группы.
@@ -300,6 +339,28 @@ class CommentsTests(TestCase):
         comment = response.context['comments'][0]
         self.assertEqual(comment.text, self.comment.text)
 
+    def test_comments_paginated_by_cursor(self):
+        """Комментарии выводятся страницами от старых к новым,
+        число запросов не зависит от числа комментариев."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Ответ {i}')
+            for i in range(NUMBER_COMMENTS + 5)
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        PostCounter.objects.get_count(author=self.user)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), NUMBER_COMMENTS)
+        self.assertEqual(comments[0], self.comment)
+        self.assertTrue(comments.has_next())
+        response = self.client.get(url, {'after': comments.next_cursor})
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 6)
+        self.assertEqual(comments[5].text, f'Ответ {NUMBER_COMMENTS + 4}')
+        self.assertFalse(comments.has_next())
+
 
 class CacheTests(TestCase):
     """Тестирование кэша страниц."""
@@ -396,3 +457,120 @@ class FollowTests(TestCase):
             reverse('posts:follow_index')
         )
         self.assertEqual(len(response_unfollow.context['page_obj']), 0)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка не создает вторую запись в БД."""
+        url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_auth.username}
+        )
+        self.client_unfollow.get(url)
+        self.client_unfollow.get(url)
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.user_unfollow, author=self.user_auth
+            ).count(), 1
+        )
+
+    def test_follow_is_unique(self):
+        """Пара (user, author) уникальна на уровне БД."""
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(
+                user=self.user_follow,
+                author=self.user_auth
+            )
+
+
+class FeedQueriesTests(TestCase):
+    """Проверяет, что число запросов ленты не зависит от числа записей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(
+            username='reader'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovaya-gruppa',
+            description='Тестовое описание',
+        )
+        for i in range(NUMBER_POSTS):
+            author = User.objects.create(
+                username=f'author{i}',
+                first_name='Имя',
+                last_name=f'Фамилия {i}'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text='Какая-то тестовая запись' + str(i),
+                author=author,
+                group=cls.group
+            )
+            Comment.objects.bulk_create(
+                Comment(post=post, author=cls.reader, text=f'Ответ {j}')
+                for j in range(LATEST_COMMENTS + 2)
+            )
+        cls.author = author
+        call_command('rebuild_post_counters', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_queries(self):
+        """Лента строится фиксированным числом запросов."""
+        pages = {
+            reverse('posts:posts_list'): 2,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 4,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 4,
+        }
+        for page, queries in pages.items():
+            with self.subTest(page=page):
+                with self.assertNumQueries(queries):
+                    self.client.get(page)
+
+    def test_first_page_is_not_counted(self):
+        """Первая страница ленты не считает записи COUNT(*): главная
+        выбирается по ключу, сообщество и профиль берут число записей
+        из счетчиков."""
+        pages = (
+            reverse('posts:posts_list'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(page)
+                self.assertFalse([
+                    query['sql'] for query in queries
+                    if 'COUNT(*)' in query['sql']
+                ])
+
+    def test_follow_feed_queries(self):
+        """Лента подписок строится фиксированным числом запросов:
+        строки ленты и подмешанные записи считаются и читаются отдельно,
+        затем одним запросом загружаются записи страницы."""
+        with self.assertNumQueries(8):
+            response = self.authorized_client.get(
+                reverse('posts:follow_index')
+            )
+        self.assertEqual(len(response.context['page_obj']), NUMBER_POSTS)
+
+    def test_feed_comments(self):
+        """Лента выводит число комментариев и последние комментарии."""
+        response = self.client.get(reverse('posts:posts_list'))
+        post = response.context['page_obj'][0]
+        self.assertEqual(post.comments_count, LATEST_COMMENTS + 2)
+        self.assertEqual(
+            [comment.text for comment in post.latest_comments],
+            [f'Ответ {j}' for j in reversed(range(2, LATEST_COMMENTS + 2))]
+        )
+        self.assertContains(response, '<p>Ответ 2</p>')
+        self.assertNotContains(response, '<p>Ответ 1</p>')
@@ -0,0 +1,163 @@
+"""Фоновая подготовка миниатюр для картинок записей.
+
+После сохранения записи загруженная картинка нормализуется
+(см. uploads.py), затем создаются миниатюры всех размеров
+из THUMBNAIL_GEOMETRIES и регистрируются в хранилище sorl. Большие картинки
+обрабатывает пул потоков, небольшие - сам запрос. Шаблоны только
+ищут готовую миниатюру и, пока ее нет, выводят исходную картинку,
+поэтому готовые миниатюры сбрасывают кэш страниц своих записей.
+Для страницы ленты миниатюры всех записей находятся одним запросом
+к кэшу через prefetch_thumbnails.
+Имена файлов совпадают с теми, что строит {% thumbnail %} из sorl."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .caching import invalidate_tags, post_tag
+from .uploads import normalize_image
+
+THUMBNAIL_GEOMETRIES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+THUMBNAIL_WORKERS = 2
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+class PrecomputedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который отдельно ищет и отдельно создает миниатюры."""
+
+    def get_thumbnail_file(self, file_, geometry_string, storage, **options):
+        """Файл миниатюры с тем же именем, что и в get_thumbnail."""
+        source = ImageFile(file_, storage)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, ImageFile(name, storage), options
+
+    def create_thumbnail(self, file_, geometry_string, storage, **options):
+        """Создает файл миниатюры, если его еще нет,
+        и регистрирует миниатюру в хранилище sorl."""
+        source, thumbnail, options = self.get_thumbnail_file(
+            file_, geometry_string, storage, **options
+        )
+        if not thumbnail.exists():
+            source_image = default.engine.get_image(source)
+            try:
+                options['image_info'] = default.engine.get_image_info(
+                    source_image
+                )
+                source.set_size(default.engine.get_image_size(source_image))
+                self._create_thumbnail(
+                    source_image, geometry_string, options, thumbnail
+                )
+            finally:
+                default.engine.cleanup(source_image)
+        default.kvstore.get_or_set(source)
+        default.kvstore.set(thumbnail, source)
+        return thumbnail
+
+
+backend = PrecomputedThumbnailBackend()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def get_thumbnail_file(image, geometry):
+    _, thumbnail, _ = backend.get_thumbnail_file(
+        image.name, geometry, default_storage,
+        **THUMBNAIL_GEOMETRIES[geometry]
+    )
+    return thumbnail
+
+
+def prefetch_thumbnails(posts):
+    """Находит готовые миниатюры всех записей одним запросом к кэшу."""
+    thumbnails = {
+        (post, geometry): get_thumbnail_file(post.image, geometry)
+        for post in posts if post.image
+        for geometry in THUMBNAIL_GEOMETRIES
+    }
+    found = default.kvstore.get_many(thumbnails.values())
+    for (post, geometry), thumbnail in thumbnails.items():
+        if not hasattr(post, '_prefetched_thumbnails'):
+            post._prefetched_thumbnails = {}
+        post._prefetched_thumbnails[geometry] = found.get(thumbnail.key)
+
+
+def lookup_thumbnail(image, geometry):
+    """Возвращает готовую миниатюру картинки или None.
+    Если миниатюры нет в хранилище sorl, проверяет наличие файла."""
+    prefetched = getattr(image.instance, '_prefetched_thumbnails', {})
+    if prefetched.get(geometry):
+        return prefetched[geometry]
+    thumbnail = get_thumbnail_file(image, geometry)
+    if geometry not in prefetched:
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+    if thumbnail.exists():
+        return thumbnail
+    return None
+
+
+def generate_thumbnails(name, storage=default_storage, post_ids=()):
+    """Создает миниатюры всех размеров для картинки и сбрасывает кэш
+    страниц записей post_ids, закэшированных с исходной картинкой."""
+    for geometry, options in THUMBNAIL_GEOMETRIES.items():
+        backend.create_thumbnail(name, geometry, storage, **options)
+    invalidate_tags(*map(post_tag, post_ids))
+
+
+def process_image(name, storage, post_id):
+    try:
+        normalize_image(name, storage)
+        generate_thumbnails(name, storage, [post_id])
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', name)
+
+
+def queue_thumbnails(image):
+    """Ставит нормализацию картинки и создание миниатюр в очередь
+    после фиксации транзакции. Небольшая картинка обрабатывается сразу.
+    Хранилище фиксируется заранее, чтобы воркер писал туда же,
+    куда была загружена картинка."""
+    if not image:
+        return
+    name = image.name
+    post_id = image.instance.pk
+    storage = FileSystemStorage(
+        location=default_storage.location, base_url=default_storage.base_url
+    )
+    if image.width * image.height <= settings.POST_IMAGE_INLINE_PIXELS:
+        transaction.on_commit(
+            lambda: process_image(name, storage, post_id)
+        )
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(
+                process_image, name, storage, post_id
+            )
+        )
@@ -0,0 +1,142 @@
+"""Материализованная лента подписок.
+
+Новая запись раскладывается в ленты подписчиков автора при создании.
+Записи авторов, у которых больше FANOUT_FOLLOWERS_LIMIT подписчиков,
+не раскладываются: при сохранении они отмечаются полем pulled и
+подмешиваются в ленту при чтении. Решение принимается один раз для
+каждой записи, поэтому запись не пропадает из лент и не дублируется,
+когда число подписчиков автора пересекает порог.
+Лента читается страницами по индексу (user, -pub_date, -post) таблицы
+TimelineEntry, записи страницы загружаются отдельным запросом.
+Когда записи хранятся на шардах, лента не раскладывается и собирается
+при чтении из записей всех авторов подписок."""
+from django.db.models import Count, F
+
+from .models import Follow, Post, TimelineEntry
+from .sharding import MergedFeed, for_authors, is_sharded
+
+BACKFILL_POSTS = 200
+FANOUT_FOLLOWERS_LIMIT = 1000
+BATCH_SIZE = 500
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def set_pulled(posts):
+    """Отмечает новые записи авторов, у которых слишком много
+    подписчиков для раскладки."""
+    if is_sharded():
+        return
+    pull_author_ids = set(
+        Follow.objects.filter(
+            author__in={post.author_id for post in posts}
+        ).order_by().values('author').annotate(
+            followers=Count('pk')
+        ).filter(
+            followers__gt=FANOUT_FOLLOWERS_LIMIT
+        ).values_list('author', flat=True)
+    )
+    for post in posts:
+        post.pulled = post.author_id in pull_author_ids
+
+
+def fan_out(post):
+    """Добавляет новую запись в ленты подписчиков автора."""
+    if is_sharded() or post.pulled:
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=post.author_id
+            ).values_list('user_id', flat=True)
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_many(posts):
+    """Добавляет пачку записей, например загруженных из файла,
+    в ленты подписчиков их авторов."""
+    if is_sharded():
+        return
+    posts = [post for post in posts if post.pk and not post.pulled]
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+        author__in={post.author_id for post in posts}
+    ).values_list('user_id', 'author_id'):
+        followers.setdefault(author_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          pub_date=post.pub_date)
+            for post in posts
+            for user_id in followers.get(post.author_id, ())
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(follow):
+    """Добавляет в ленту подписчика последние записи автора."""
+    if is_sharded():
+        return
+    posts = Post.objects.filter(
+        author_id=follow.author_id, pulled=False
+    ).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:BACKFILL_POSTS]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=follow.user_id, post_id=pk, pub_date=date)
+            for pk, date in posts
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def prune(follow):
+    """Удаляет записи автора из ленты бывшего подписчика."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+class TimelineFeed(MergedFeed):
+    """Лента подписок: строки TimelineEntry и записи, подмешиваемые при
+    чтении, сливаются по TIMELINE_ORDERING, а для выбранного среза
+    загружаются записи ленты с авторами и комментариями."""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return super().__getitem__(key)
+        rows = super().__getitem__(key)
+        posts = Post.objects.feed().annotate(post_id=F('pk')).in_bulk(
+            [row.post_id for row in rows]
+        )
+        return [posts[row.post_id] for row in rows if row.post_id in posts]
+
+
+def get_timeline(user):
+    """Записи ленты подписок пользователя. Ленту нужно упорядочить
+    по TIMELINE_ORDERING."""
+    if is_sharded():
+        return for_authors(
+            Post.objects.feed().annotate(post_id=F('pk')),
+            list(Follow.objects.filter(user=user).values_list(
+                'author', flat=True
+            ))
+        )
+    # Подмешанная запись не должна попасть в ленту второй раз через
+    # TimelineEntry, даже если строка для нее осталась.
+    return TimelineFeed({
+        'entries': TimelineEntry.objects.filter(
+            user=user, post__pulled=False
+        ).only('post', 'pub_date'),
+        'pulled': Post.objects.filter(
+            pulled=True,
+            author__in=Follow.objects.filter(user=user).values('author')
+        ).annotate(post_id=F('pk')).only('pub_date'),
+    }, TIMELINE_ORDERING)
@@ -0,0 +1,87 @@
+"""Нормализация загруженных картинок записей.
+
+Картинка поворачивается по EXIF, уменьшается до POST_IMAGE_MAX_SIZE
+и сохраняется в JPEG без метаданных. Небольшие картинки форма
+перекодирует сразу, остальные только получают имя с расширением .jpg,
+а перекодирует их на месте воркер после сохранения записи.
+Имя файла при этом не меняется, поэтому воркеру не нужна БД."""
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+NORMALIZED_FORMAT = 'JPEG'
+NORMALIZED_EXTENSION = '.jpg'
+NORMALIZED_CONTENT_TYPE = 'image/jpeg'
+
+
+def get_normalized_name(name):
+    """Имя, под которым картинка будет храниться после перекодирования."""
+    return os.path.splitext(name)[0] + NORMALIZED_EXTENSION
+
+
+def is_normalized(image):
+    return (
+        image.format == NORMALIZED_FORMAT
+        and image.mode == 'RGB'
+        and max(image.size) <= settings.POST_IMAGE_MAX_SIZE
+        and 'exif' not in image.info
+    )
+
+
+def flatten(image):
+    """Переводит картинку в RGB, прозрачные области становятся белыми."""
+    if image.mode == 'P' and 'transparency' in image.info:
+        image = image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def normalize(source, output):
+    """Записывает нормализованную картинку в файл output."""
+    image = flatten(ImageOps.exif_transpose(source))
+    image.thumbnail(
+        (settings.POST_IMAGE_MAX_SIZE, settings.POST_IMAGE_MAX_SIZE),
+        Image.LANCZOS
+    )
+    image.save(
+        output, NORMALIZED_FORMAT,
+        quality=settings.POST_IMAGE_QUALITY, optimize=True
+    )
+
+
+def normalize_upload(upload):
+    """Возвращает нормализованную копию загруженной картинки."""
+    upload.seek(0)
+    output = BytesIO()
+    with Image.open(upload) as source:
+        normalize(source, output)
+    return SimpleUploadedFile(
+        get_normalized_name(upload.name), output.getvalue(),
+        NORMALIZED_CONTENT_TYPE
+    )
+
+
+def normalize_image(name, storage):
+    """Перекодирует картинку в хранилище на месте,
+    если она еще не нормализована."""
+    path = storage.path(name)
+    with Image.open(path) as source:
+        if is_normalized(source):
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                normalize(source, output)
+            os.chmod(temp_path, storage.file_permissions_mode or 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -15,6 +15,12 @@ urlpatterns = [
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('live/', views.live_feed, name='live_feed'),
+    path('follow/live/', views.follow_live_feed, name='follow_live_feed'),
+    path('search/', views.search, name='search'),
+    path(
+        'autocomplete/', views.autocomplete_search, name='autocomplete'
+    ),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
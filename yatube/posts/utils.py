@@ -1,9 +1,150 @@
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
 NUMBER_POSTS = 10
+NUMBER_COMMENTS = 50
+CURSOR_ORDERING = ('-pub_date', '-pk')
+COMMENT_CURSOR_ORDERING = ('created', 'pk')
 
 
-def get_page_paginator(request, posts):
-    paginator = Paginator(posts, NUMBER_POSTS)
+def encode_cursor(obj, field='pub_date', key='pk'):
+    """Кодирует ключ (дата, id) объекта в непрозрачный токен."""
+    return urlsafe_base64_encode(force_bytes(
+        f'{getattr(obj, field).isoformat()}|{getattr(obj, key)}'
+    ))
+
+
+def decode_cursor(token):
+    """Возвращает ключ (pub_date, id) из токена.
+    Для поврежденного токена возвращает None."""
+    try:
+        pub_date, pk = urlsafe_base64_decode(token).decode().split('|')
+        pub_date, pk = parse_datetime(pub_date), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница, полученная по токену ?after=.
+    Номер страницы и общее число записей для нее неизвестны."""
+
+    def __init__(self, object_list, paginator, cursor, next_cursor):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f'<Page after {self.cursor}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+
+class FeedPaginator(Paginator):
+    """Пагинатор ленты, который считает записи без ее аннотаций."""
+
+    @cached_property
+    def count(self):
+        return self.object_list.values('pk').count()
+
+
+class CursorPaginator(FeedPaginator):
+    """Пагинатор по ключу (дата, id), по умолчанию (pub_date, pk).
+
+    Страницы ?page=N отдаются как обычно, а ссылка на следующую страницу
+    строится по ключу последней записи, поэтому ?after= выбирается одним
+    запросом по индексу, без OFFSET и COUNT(*)."""
+
+    def __init__(self, object_list, per_page, count=None,
+                 ordering=CURSOR_ORDERING):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.cursor_field = ordering[0].lstrip('-')
+        self.cursor_key = ordering[1].lstrip('-')
+        self.cursor_lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        if count is not None:
+            self.count = count
+
+    def _get_page(self, object_list, *args, **kwargs):
+        page = super()._get_page(list(object_list), *args, **kwargs)
+        page.next_cursor = None
+        if page.has_next():
+            page.next_cursor = encode_cursor(
+                page.object_list[-1], self.cursor_field, self.cursor_key
+            )
+        return page
+
+    def page_after(self, token):
+        """Возвращает страницу записей, следующих за ключом из токена."""
+        if decode_cursor(token) is None:
+            return self.get_page(None)
+        return self.cursor_page(token)
+
+    def cursor_page(self, token=None):
+        """Возвращает страницу, следующую за ключом из токена.
+        Без токена или с поврежденным токеном возвращает первую страницу,
+        не считая общее число объектов."""
+        cursor = decode_cursor(token) if token else None
+        objects = self.object_list
+        if cursor is None:
+            token = None
+        else:
+            key, pk = cursor
+            field, lookup = self.cursor_field, self.cursor_lookup
+            objects = objects.filter(
+                Q(**{f'{field}__{lookup}': key})
+                | Q(**{field: key, f'{self.cursor_key}__{lookup}': pk})
+            )
+        objects = list(objects[:self.per_page + 1])
+        next_cursor = None
+        if len(objects) > self.per_page:
+            objects = objects[:self.per_page]
+            next_cursor = encode_cursor(
+                objects[-1], self.cursor_field, self.cursor_key
+            )
+        return CursorPage(objects, self, token, next_cursor)
+
+
+def get_page_paginator(request, posts, count=None,
+                       ordering=CURSOR_ORDERING):
+    """Страница ленты. Первая страница без известного заранее count
+    выбирается по ключу, как ?after=, без COUNT(*); номера страниц
+    выводятся, только когда число записей взято из счетчика или запрошена
+    страница ?page=N."""
+    paginator = CursorPaginator(posts, NUMBER_POSTS, count, ordering)
+    after = request.GET.get('after')
+    if after:
+        return paginator.page_after(after)
     page_number = request.GET.get('page')
+    if page_number is None and count is None:
+        return paginator.cursor_page()
     return paginator.get_page(page_number)
+
+
+def get_cursor_page(request, posts, ordering=CURSOR_ORDERING):
+    """Страница записей по токену ?after= без подсчета их общего числа."""
+    paginator = CursorPaginator(posts, NUMBER_POSTS, ordering=ordering)
+    return paginator.cursor_page(request.GET.get('after'))
+
+
+def get_ranked_page(request, posts):
+    """Страница записей в порядке выборки, например по релевантности."""
+    paginator = FeedPaginator(posts, NUMBER_POSTS)
+    return paginator.get_page(request.GET.get('page'))
+
+
+def get_comments_page(request, comments):
+    """Страница комментариев от старых к новым по токену ?after=."""
+    paginator = CursorPaginator(
+        comments, NUMBER_COMMENTS, ordering=COMMENT_CURSOR_ORDERING
+    )
+    return paginator.cursor_page(request.GET.get('after'))
@@ -1,16 +1,32 @@
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import autocomplete, live
+from .caching import (FEED_TAG, add_cache_tags, add_last_modified,
+                      author_tag, cache_anonymous_page, conditional_page,
+                      follower_tag, get_page_dates, get_page_tags, group_tag,
+                      post_tag)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import get_page_paginator
+from .models import Follow, Group, Post, PostCounter, User
+from .search import search_posts
+from .sharding import for_author, get_post_or_404, sharded
+from .thumbnails import prefetch_thumbnails, queue_thumbnails
+from .timeline import TIMELINE_ORDERING, get_timeline
+from .utils import get_comments_page, get_page_paginator, get_ranked_page
 
 
+@conditional_page
+@cache_anonymous_page
 def index(request):
     """функция для формирования главной страницы."""
     template = 'posts/index.html'
-    posts = Post.objects.select_related('group')
+    posts = sharded(Post.objects.feed())
     page_obj = get_page_paginator(request, posts)
+    prefetch_thumbnails(page_obj)
+    add_cache_tags(request, FEED_TAG, *get_page_tags(page_obj))
+    add_last_modified(request, *get_page_dates(page_obj))
 
     context = {
         'page_obj': page_obj,
@@ -19,12 +35,19 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional_page
+@cache_anonymous_page
 def group_posts(request, slug):
     """функция для формирования страницы с записями сообщества."""
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts_group.all()
-    page_obj = get_page_paginator(request, posts)
+    posts = sharded(Post.objects.feed()).filter(group=group)
+    page_obj = get_page_paginator(
+        request, posts, PostCounter.objects.get_count(group=group)
+    )
+    prefetch_thumbnails(page_obj)
+    add_cache_tags(request, group_tag(group.pk), *get_page_tags(page_obj))
+    add_last_modified(request, *get_page_dates(page_obj))
 
     context = {
         'group': group,
@@ -34,15 +57,25 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_page
+@cache_anonymous_page
 def profile(request, username):
     """Функция для формирования страницы профиля пользователя."""
     template = 'posts/profile.html'
     user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    page_obj = get_page_paginator(request, posts)
+    posts = for_author(Post.objects.feed(), user.pk).filter(author=user)
+    page_obj = get_page_paginator(
+        request, posts, PostCounter.objects.get_count(author=user)
+    )
+    prefetch_thumbnails(page_obj)
+    add_cache_tags(
+        request, author_tag(user.pk), *get_page_tags(page_obj)
+    )
+    add_last_modified(request, *get_page_dates(page_obj))
     following = False
 
     if request.user.is_authenticated:
+        add_cache_tags(request, follower_tag(request.user.pk))
         if Follow.objects.filter(user=request.user, author=user).exists():
             following = True
 
@@ -55,13 +88,26 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@conditional_page
+@cache_anonymous_page
 def post_detail(request, post_id):
     """Функция формирования страницы поста."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    count_posts = post.author.posts.count()
-    comments = post.comments.all()
+    post = get_post_or_404(
+        Post.objects.select_related('author', 'group'), post_id
+    )
+    prefetch_thumbnails([post])
+    count_posts = PostCounter.objects.get_count(author_id=post.author_id)
+    comments = get_comments_page(
+        request, post.comments.select_related('author')
+    )
     form = CommentForm()
+    add_cache_tags(request, post_tag(post.pk), author_tag(post.author_id))
+    if post.group_id:
+        add_cache_tags(request, group_tag(post.group_id))
+    add_last_modified(
+        request, post.pub_date, *(comment.created for comment in comments)
+    )
 
     context = {
         'post': post,
@@ -83,6 +129,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        queue_thumbnails(post.image)
         return redirect('posts:profile', username=request.user)
 
     context = {'form': form}
@@ -94,7 +141,7 @@ def post_create(request):
 def post_edit(request, post_id):
     """Изменение поста пользователем."""
     template = 'posts/create_post.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_post_or_404(Post.objects, post_id)
 
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
@@ -105,6 +152,8 @@ def post_edit(request, post_id):
 
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            queue_thumbnails(post.image)
         return redirect('posts:post_detail', post_id=post_id)
 
     context = {
@@ -119,7 +168,7 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     """Добавить комментарий к посту."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_post_or_404(Post.objects, post_id)
     form = CommentForm(request.POST or None)
 
     if form.is_valid():
@@ -135,23 +184,67 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Вывести посты авторов, на которых подписан пользователь."""
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page_paginator(request, posts)
+    posts = get_timeline(request.user)
+    # Лента подписок выводит номера страниц, поэтому ее записи считаются:
+    # счетчика для нее нет, а COUNT(*) идет по индексу TimelineEntry.
+    page_obj = get_page_paginator(
+        request, posts, posts.count(), ordering=TIMELINE_ORDERING
+    )
+    prefetch_thumbnails(page_obj)
+    context = {
+        'page_obj': page_obj,
+    }
+
+    return render(request, template, context)
+
+
+def search(request):
+    """Поиск записей по тексту."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '')
+    posts = search_posts(sharded(Post.objects.feed()), query)
+    page_obj = get_ranked_page(request, posts)
+    prefetch_thumbnails(page_obj)
     context = {
+        'query': query,
         'page_obj': page_obj,
     }
 
     return render(request, template, context)
 
 
+def autocomplete_search(request):
+    """Подсказки сообществ и авторов по началу строки в формате JSON."""
+    results = autocomplete.index.search(request.GET.get('q', ''))
+    return JsonResponse({'results': results})
+
+
+@login_required
+def live_feed(request):
+    """Поток новых записей в формате Server-Sent Events."""
+    return live.stream_response(request)
+
+
+@login_required
+def follow_live_feed(request):
+    """Поток новых записей авторов, на которых подписан пользователь."""
+    author_ids = set(
+        request.user.follower.values_list('author_id', flat=True)
+    )
+    return live.stream_response(request, author_ids)
+
+
 @login_required
 def profile_follow(request, username):
     """Подписаться на автора."""
     author = get_object_or_404(User, username=username)
     if author == request.user:
         return redirect('posts:profile', username=username)
-    if not Follow.objects.filter(user=request.user, author=author).exists():
-        Follow.objects.create(user=request.user, author=author)
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=request.user, author=author)
+    except IntegrityError:
+        pass
 
     return redirect('posts:profile', username=username)
 
@@ -12,25 +12,45 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
+def env_list(name, default):
+    value = os.getenv(name)
+    return value.split(',') if value else default
+
+
+# Профиль настроек задается переменной окружения YATUBE_PROFILE:
+# development (по умолчанию) или production. Отдельные значения
+# переопределяются переменными DJANGO_*.
+PRODUCTION = os.getenv('YATUBE_PROFILE', 'development') == 'production'
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 's3ivi+95+h4$(&h9y^ho!h_9)vbmrq&zw_!p983x@p@x^gw@))'
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    # Ключ из репозитория известен всем, в production он недопустим.
+    if PRODUCTION:
+        raise ImproperlyConfigured(
+            'В production-профиле задайте переменную DJANGO_SECRET_KEY.'
+        )
+    SECRET_KEY = 's3ivi+95+h4$(&h9y^ho!h_9)vbmrq&zw_!p983x@p@x^gw@))'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DJANGO_DEBUG', str(not PRODUCTION)) == 'True'
 
-ALLOWED_HOSTS = [
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', [
     'localhost',
     '127.0.0.1',
     '[::1]',
     'testserver',
-]
+])
 
 
 # Application definition
@@ -47,26 +67,31 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки для Server-Timing.
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +106,16 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCTION:
+    # Скомпилированные шаблоны хранятся в памяти процесса.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -90,11 +125,48 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.getenv(
+            'DJANGO_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Соединение с БД переиспользуется между запросами.
+        'CONN_MAX_AGE': int(
+            os.getenv('DJANGO_CONN_MAX_AGE', 600 if PRODUCTION else 0)
+        ),
     }
 }
 
 
+# Реплики только для чтения: пути к копиям основной БД через запятую.
+DATABASE_REPLICAS = []
+for number, name in enumerate(env_list('DJANGO_DB_REPLICAS', []), 1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'NAME': name}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+# Шарды записей и комментариев: пути к файлам SQLite через запятую.
+# После изменения списка выполните manage.py rebalance_shards.
+POST_SHARDS = []
+for number, name in enumerate(env_list('DJANGO_POST_SHARDS', []), 1):
+    DATABASES[f'shard_{number}'] = {**DATABASES['default'], 'NAME': name}
+    POST_SHARDS.append(f'shard_{number}')
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+# Сколько секунд после записи клиент читает из основной БД.
+REPLICA_PIN_SECONDS = 5
+
+# Настройки каждого соединения с SQLite (см. core.signals).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер кэша страниц в КиБ.
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -147,12 +219,52 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загруженные файлы пишутся сразу на диск, а не в память.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Картинки записей уменьшаются до этого размера по большей стороне.
+POST_IMAGE_MAX_SIZE = 1920
+POST_IMAGE_QUALITY = 85
+# Картинки меньше этого числа пикселей обрабатываются прямо в запросе.
+POST_IMAGE_INLINE_PIXELS = 512 * 512
+
+# В production кэш общий для всех процессов: по умолчанию файловый,
+# для memcached укажите DJANGO_CACHE_BACKEND и DJANGO_CACHE_LOCATION.
+# Счетчики живой ленты и автодополнения требуют атомарного incr, поэтому
+# файловый кэш заменен на core.cache_backends.FileBasedCache с блокировкой.
+# В кэше без срока хранятся версии тегов и данные миниатюр, поэтому
+# при переполнении удаляется лишь десятая часть записей. Размер каталога
+# проверяется раз в сотню записей перебором файлов, поэтому лимит
+# рассчитан на один сервер; при большем объеме нужен memcached.
+if PRODUCTION:
+    CACHE_BACKEND = 'core.cache_backends.FileBasedCache'
+    CACHE_LOCATION = os.path.join(BASE_DIR, 'cache')
+else:
+    CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+    CACHE_LOCATION = ''
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', CACHE_BACKEND),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', CACHE_LOCATION),
     }
 }
+if CACHES['default']['BACKEND'] == 'core.cache_backends.FileBasedCache':
+    # OPTIONS других бэкендов, например memcached, уходят в клиент.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('DJANGO_CACHE_MAX_ENTRIES', 20000)),
+        'CULL_FREQUENCY': 10,
+    }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+
+# Хаб живой ленты: posts.live.LocalHub или posts.live.CacheHub
+# для нескольких процессов с общим кэшем.
+LIVE_FEED_HUB = (
+    'posts.live.CacheHub' if PRODUCTION else 'posts.live.LocalHub'
+)